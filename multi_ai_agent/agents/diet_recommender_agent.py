@@ -0,0 +1,128 @@
+import asyncio
+import logging
+import os
+from typing import List, Optional, Tuple
+from dotenv import load_dotenv
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langgraph.prebuilt import create_react_agent
+from agents.health_profile_agent import get_dietary_restrictions
+from utilities.context_manager import context_manager
+from utilities.diet_compatibility import DietCompatibilityMatrix
+from utilities.diet_rules import DietRuleEngine, OrderVerdict
+from utilities.instrumentation import metrics
+from utilities.menu_catalog import menu_catalog
+from utilities.profile_repository import profile_repository
+from utilities.thread_util import get_current_user_id
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+DIET_RULE_ENGINE_ENABLED = os.getenv("DIET_RULE_ENGINE", "on").lower() != "off"
+metrics.describe("diet_prescreen_total", "Diet reviews decided by the rule engine (approve/reject) or escalated to the LLM")
+
+# Tools of the restaurant worker whose restaurant_id tells which menu the user is ordering from
+MENU_TOOLS = ("get_menu", "search_menu", "get_items")
+
+
+def get_compatibility_matrix(restaurant_id: Optional[str] = None) -> DietCompatibilityMatrix:
+    # Computed once per mapped menu on first use, reused for every review
+    return menu_catalog.get(restaurant_id).cached("compatibility_matrix", DietCompatibilityMatrix)
+
+def get_rule_engine(restaurant_id: Optional[str] = None) -> DietRuleEngine:
+    return menu_catalog.get(restaurant_id).cached(
+        "rule_engine", lambda menu: DietRuleEngine(menu.cached("compatibility_matrix", DietCompatibilityMatrix)))
+
+async def get_menu_compatibility(restaurant_id: Optional[str] = None) -> dict:
+    """
+    This function pre-screens every menu item against the user's dietary restrictions.
+    Args:
+        restaurant_id: id of the restaurant being ordered from, defaults to the South Indian vegetarian restaurant
+    Output:
+        compatibility: dict with safe, caution (past conditions) and avoid (current conditions) item lists,
+        the restriction categories each flagged item hits and any restrictions that could not be screened
+    """
+    try:
+        restrictions = await get_dietary_restrictions()
+        if not restrictions["status"]:
+            return restrictions
+        matrix = await asyncio.to_thread(get_compatibility_matrix, restaurant_id)
+        compatibility = matrix.classify(
+            restrictions["data"]["current_restrictions"],
+            restrictions["data"]["past_restrictions"],
+        )
+        return {"status": True, "data": compatibility}
+    except Exception as e:
+        return {"status": False, "data": f"Error screening menu compatibility: {str(e)}"}
+
+diet_recommender_tools = [get_menu_compatibility]
+
+
+def create_diet_recommender_agent(llm: BaseChatModel, system_prompt: str):
+    def diet_recommender_prompt(state):
+        return [SystemMessage(content=system_prompt)] + context_manager.prepare("Diet_Recommender_Worker", state["messages"])
+
+    return create_react_agent(model=llm, tools=diet_recommender_tools, prompt=diet_recommender_prompt)
+
+
+def find_order_items(messages) -> Tuple[Optional[str], List[dict]]:
+    """
+    Restaurant and order under review in the current turn: the latest place_order call,
+    else the items the user explicitly ordered with a quantity, on the menu of the
+    restaurant the turn's menu lookups resolved (the default one when there were none).
+    Items the user only mentions and menu listings of the other workers are not
+    treated as an order.
+    """
+    turn_start = max((index for index, message in enumerate(messages) if isinstance(message, HumanMessage)), default=0)
+    turn = messages[turn_start:]
+    tool_calls = [tool_call for message in reversed(turn) for tool_call in reversed(getattr(message, "tool_calls", None) or [])]
+    for tool_call in tool_calls:
+        if tool_call["name"] == "place_order":
+            return tool_call["args"].get("restaurant_id"), tool_call["args"].get("order_items", [])
+    restaurant_id = next((tool_call["args"]["restaurant_id"] for tool_call in tool_calls
+                          if tool_call["name"] in MENU_TOOLS and tool_call["args"].get("restaurant_id")), None)
+    if turn and isinstance(turn[0], HumanMessage) and isinstance(turn[0].content, str):
+        return restaurant_id, get_rule_engine(restaurant_id).extract_ordered_items(turn[0].content)
+    return restaurant_id, []
+
+
+def format_verdict(verdict: OrderVerdict, alternatives: List[dict]) -> str:
+    if verdict.decision == "approve":
+        ordered = ", ".join(f"{item['quantity']} x {item['name']} ({item['id']}, suitable for: {', '.join(item['compatible_tags'])})"
+                            for item in verdict.items)
+        return (f"Diet review: the order {ordered} is approved, every item is tagged as suitable for the user's "
+                "current conditions and hits none of their dietary restrictions. "
+                "Proceed with placing it with is_diet_recommended set to true.")
+    conflicts = "; ".join(f"{item['name']} ({item['id']}): {', '.join(item['reasons'])}"
+                          for item in verdict.items if item["status"] == "avoid")
+    if alternatives:
+        suggestions = "Suggested alternatives from the menu: " + ", ".join(f"{item['name']} ({item['id']})" for item in alternatives) + "."
+    else:
+        suggestions = "No other menu item is tagged as suitable for the user's conditions."
+    return (f"Diet review: the order is not approved, these items conflict with the user's current health conditions: "
+            f"{conflicts}. {suggestions}")
+
+
+def prescreen_order(state) -> Optional[dict]:
+    """
+    Reviews the order with the rule engine before the diet recommender LLM runs. Returns
+    the review message for clear approvals and rejections, None to escalate to the LLM.
+    """
+    if not DIET_RULE_ENGINE_ENABLED:
+        return None
+    try:
+        restaurant_id, order_items = find_order_items(state["messages"])
+        rule_engine = get_rule_engine(restaurant_id)
+        restrictions = profile_repository.get_restrictions(get_current_user_id())
+        verdict = rule_engine.evaluate(order_items, restrictions)
+    except Exception as e:
+        logger.warning("diet rule engine failed, escalating to the LLM: %s", e)
+        return None
+    metrics.inc("diet_prescreen_total", {"decision": verdict.decision})
+    logger.info("diet rule engine: %s (%s)", verdict.decision, verdict.reason)
+    if verdict.decision == "escalate":
+        return None
+    alternatives = rule_engine.alternatives(restrictions) if verdict.decision == "reject" else []
+    return {"messages": [AIMessage(content=format_verdict(verdict, alternatives))]}
+
@@ -1,19 +1,24 @@
 from langgraph.graph.message import MessagesState
-from langgraph.checkpoint.memory import MemorySaver
 from langgraph.graph import StateGraph, START, END
 from typing import Literal, List
 from typing_extensions import TypedDict
+import asyncio
 import os
+import time
 from dotenv import load_dotenv
-from utilities.llm_provider import llm
-
-# Assuming these are imported from their respective files
-from agents.restaurant_agent import RestaurantAgent
-from agents.health_profile_agent import HealthProfileAgent
-from agents.fall_back_llm_agent import FallBackLLMAgent
+from utilities.checkpointer import checkpointer
+from utilities.llm_provider import get_llm, llm_cache
+from utilities.context_manager import context_manager
+from utilities.streaming import run_subgraph, streaming_metrics
+from utilities.instrumentation import metrics, turn_profiler, InstrumentationCallbackHandler, maybe_start_metrics_server
+from utilities.thread_util import get_current_thread_id
+from utilities.turn_scheduler import TurnScheduler, turn_scheduler
+from langchain_core.messages import HumanMessage
+
+from agents.worker_registry import WorkerRegistry, worker_registry
+from agents.rule_router import create_rule_router
 import logging
-from agents.prompts import restaurant_agent_prompt, health_profile_agent_prompt, diet_recommender_agent_prompt
-from langgraph.prebuilt import create_react_agent
+from agents.prompts import supervisor_agent_prompt
 from typing import Optional, List
 
 logging.basicConfig(level=logging.INFO)
@@ -23,121 +28,210 @@ logger = logging.getLogger(__name__)
 load_dotenv()
 
 class CustomAgentState(MessagesState):
-    next: Optional[str] = None
+    next: Optional[List[str]] = None
     chain_of_thought: Optional[List[str]] = []
-
-class Router(TypedDict):
-    """
-    Worker to route to next. If no workers needed or identified, strictly route to FINISH.
+    hop_count: int = 0
+    turn_started_at: Optional[float] = None
+    turn_tokens: int = 0
+    route_history: Optional[List[list]] = None
+    exhausted_budget: Optional[str] = None
+
+def create_router_schema(members: List[str]) -> type:
+    """Structured output schema of the supervisor, with the registered workers as the allowed targets."""
+    Router = TypedDict("Router", {
+        "next": List[Literal[tuple(members + ["FINISH"])]],
+        "chain_of_thought": List[str],
+    })
+    Router.__doc__ = """
+    Workers to route to next. Select several workers only when their tasks are independent,
+    they run in parallel. If no workers needed or identified, strictly route to FINISH.
     
     Attributes:
-        next: The next worker to route to.
+        next: The next workers to route to.
         chain_of_thought: A list of strings representing the chain of thought.
     """
-    next: Literal["Restaurant_Order_Worker", "Health_Profile_Worker", "Diet_Recommender_Worker", "General_LLM_Worker", "FINISH"]
-    chain_of_thought: List[str]
+    return Router
 
 class HealthyDietSupervisorAgent:
-    def __init__(self):
-        self.llm = llm
-        self.members = ["Restaurant_Order_Worker", "Health_Profile_Worker", "Diet_Recommender_Worker", "General_LLM_Worker"]
-        self.restaurant_agent_object = RestaurantAgent(llm, restaurant_agent_prompt)
-        self.health_profile_agent_object = HealthProfileAgent(llm, health_profile_agent_prompt)
-        self.diet_recommender_agent = create_react_agent(
-            model=llm,
-            tools=[],  # No tools as per your request
-            prompt=diet_recommender_agent_prompt
-        )
-
-        self.combined_tools = [self.restaurant_agent_object.tools, self.health_profile_agent_object.tools, [], []]
-        self.tools_json = self.generate_tools_json()
-        self.fall_back_llm_agent_object = FallBackLLMAgent(llm=llm, tools_json=self.tools_json, agents=self.members)
-        self.restaurant_agent_object.fromat_system_prompt(agents=self.members, tools_json=self.tools_json)
-        self.health_profile_agent_object.fromat_system_prompt(agents=self.members, tools_json=self.tools_json)
-        self.system_prompt = (
-            "You are a supervisor tasked with managing a conversation between workers. Your job is to understand the user input, analyze their intention, and select the appropriate worker to proceed. "
-            f"Available workers: {self.members} with the following tools respectively: {self.tools_json}. "
-            "Each worker will perform their task and return their results and status to you. "
-            "Based on the user request, follow these steps:\n"
-            "1. Analyze the user input and determine their intent.\n"
-            "2. Match the intent to a worker’s capabilities based on their tools and expertise.\n"
-            "3. If a specialized worker matches, select them as the next worker.\n"
-            "4. If the task is complete or no further action is needed, select 'FINISH'.\n"
-            "5. If the user prompt doesn’t match a specialized worker’s capabilities, select 'General_LLM_Worker'.\n"
-            "Provide your reasoning as a list of concise steps (chain of thought).\n"
-        )
-        self.supervisor_graph_agent = self.create_supervisor_graph_agent()
+    """
+    Routes each turn between the workers of the registry. Worker graphs and the chat
+    model are only built on first dispatch, so constructing the supervisor stays cheap.
+    """
 
-    async def generate_tools_json(self):
-        tools_json = {}
-        for worker, tools in zip(self.members, self.combined_tools):
-            tools_json[worker] = []
-            for tool in tools:
-                tool_info = {
-                    "name": tool.__name__,
-                    "description": tool.__doc__
-                }
-                tools_json[worker].append(tool_info)
-        return tools_json
+    def __init__(self, registry: WorkerRegistry = worker_registry, scheduler: TurnScheduler = turn_scheduler):
+        started = time.perf_counter()
+        self.registry = registry
+        self.scheduler = scheduler
+        self.members = registry.names
+        self.fallback_worker = registry.fallback_worker
+        self.router_schema = create_router_schema(self.members)
+        self.system_prompt = registry.prompt_compiler.compile("supervisor", supervisor_agent_prompt)
+        self.rule_router = create_rule_router(registry)
+        self.supervisor_graph_agent = self.create_supervisor_graph_agent()
+        self.startup_report = {
+            "startup_seconds": time.perf_counter() - started,
+            "supervisor_prompt_tokens": registry.prompt_compiler.prompts["supervisor"].tokens,
+            "workers": registry.report(),
+        }
+        logger.info("supervisor ready in %.3fs", self.startup_report["startup_seconds"])
 
     async def supervisor_node(self, state: CustomAgentState) -> CustomAgentState:
-        messages = [
-            {"role": "system", "content": self.system_prompt},
-        ] + state["messages"]
-        response = await self.llm.with_structured_output(Router).ainvoke(messages)
-        logger.info("resonse"+ str(response))
+        turn_id = get_current_thread_id() or "default"
+        if isinstance(state["messages"][-1], HumanMessage):
+            # A new user turn resets the hop count, the turn clock and the turn budgets
+            state["hop_count"] = 0
+            state["turn_started_at"] = time.time()
+            state["turn_tokens"] = 0
+            state["route_history"] = []
+            state["exhausted_budget"] = None
+            turn_profiler.start(turn_id)
+        state["hop_count"] = state.get("hop_count", 0) + 1
+        decision = self.rule_router.route(state) if self.rule_router else None
+        if decision is not None and self.rule_router.is_confident(decision):
+            source = "rule"
+            response = {"next": decision.next, "chain_of_thought": [f"fast route: {decision.reason}"]}
+        else:
+            source = "llm"
+            messages = [
+                {"role": "system", "content": self.system_prompt},
+            ] + context_manager.prepare("supervisor", state["messages"])
+            result = await get_llm().with_structured_output(self.router_schema, include_raw=True).ainvoke(messages)
+            response = result["parsed"]
+            usage = getattr(result["raw"], "usage_metadata", None) or {}
+            state["turn_tokens"] = state.get("turn_tokens", 0) + usage.get("total_tokens", 0)
+            if decision is not None:
+                self.rule_router.observe(decision, response.get("next") if response else None)
+        logger.info("supervisor hop %d routed by %s: %s", state["hop_count"], source, response)
         if response == None:
-            goto = "FINISH"
+            goto = ["FINISH"]
         else:
             if "chain_of_thought" not in state:
                 state["chain_of_thought"] = []
             if "chain_of_thought" in response:
                 state["chain_of_thought"] = response["chain_of_thought"]
-            goto = response.get("next", END)
-        if goto == "FINISH":
-            if "next" not in state or state["next"] == END:
-                goto = "General_LLM_Worker"
+            goto = self.plan_workers(response.get("next", END))
+        if goto == ["FINISH"]:
+            # Only answer with the fallback worker when no worker has run in this turn yet
+            goto = [self.fallback_worker] if state["hop_count"] == 1 else [END]
+        if goto != [END]:
+            budget = self.scheduler.exhausted_budget(state, goto)
+            if budget is not None:
+                logger.warning("turn budget %s exhausted after %d hops, finalizing instead of %s", budget, state["hop_count"], goto)
+                metrics.inc("turn_budget_exhausted_total", {"budget": budget})
+                state["exhausted_budget"] = budget
+                goto = ["Finalizer"]
             else:
-                goto = END
+                self.scheduler.record_route(state, goto)
         state["next"] = goto
+        metrics.inc("routing_decisions_total", {"decision": ",".join(goto), "source": source})
+        if goto == [END]:
+            self.finish_turn(state)
         return state
 
-    async def call_restaurant_agent(self, state: CustomAgentState) -> CustomAgentState:
-        return await self.restaurant_agent_object.restaurant_graph_agent.ainvoke({"messages": state["messages"]})
-
-    async def call_health_profile_agent(self, state: CustomAgentState) -> CustomAgentState:
-        return await self.health_profile_agent_object.health_graph_agent.ainvoke({"messages": state["messages"]})
-    
-    async def call_health_reviewer_agent(self, state: CustomAgentState) -> CustomAgentState:
-        return await self.diet_recommender_agent.ainvoke({"messages": state["messages"]})
-
-    async def call_fall_back_agent(self, state: CustomAgentState) -> CustomAgentState:
-        return await self.fall_back_llm_agent_object.fall_back_graph.ainvoke({"messages": state["messages"]})
+    @staticmethod
+    def finish_turn(state: CustomAgentState):
+        """Records hop count and wall time of the turn once it ends, at END or after a terminal worker."""
+        turn_id = get_current_thread_id() or "default"
+        metrics.observe("turn_hops", state["hop_count"])
+        if state.get("turn_started_at"):
+            duration = time.time() - state["turn_started_at"]
+            metrics.observe("turn_duration_seconds", duration)
+            turn_profiler.stop(turn_id, duration)
+
+    @staticmethod
+    def abort_turn(state: CustomAgentState):
+        """Stops the turn's profiler when a node raised, as the turn then never reaches finish_turn."""
+        if state.get("turn_started_at"):
+            turn_profiler.stop(get_current_thread_id() or "default", time.time() - state["turn_started_at"])
+
+    def guard(self, node):
+        """Wraps a node so that a node raising still stops the turn's profiler."""
+        async def guarded(state: CustomAgentState) -> CustomAgentState:
+            try:
+                return await node(state)
+            except BaseException:
+                self.abort_turn(state)
+                raise
+
+        return guarded
+
+    async def finalizer_node(self, state: CustomAgentState) -> CustomAgentState:
+        """Ends a turn that ran out of budget with the answer gathered so far, without an LLM call."""
+        self.finish_turn(state)
+        return {"messages": [self.scheduler.final_answer(state, state.get("exhausted_budget"))]}
+
+    def plan_workers(self, next_workers) -> List[str]:
+        """
+        Normalizes the routing decision into the list of workers to run in parallel, in
+        member order. FINISH and terminal workers only apply when no other worker is
+        selected, and deferred workers wait for the other workers selected with them.
+        """
+        selected = [next_workers] if isinstance(next_workers, str) else list(next_workers or [])
+        if END in selected:
+            return [END]
+        workers = [worker for worker in self.members if worker in selected]
+        specialized = [worker for worker in workers if not self.registry.specs[worker].terminal]
+        if len(specialized) > 1:
+            specialized = [worker for worker in specialized if not self.registry.specs[worker].deferred] or specialized
+        if specialized:
+            return specialized
+        return workers[:1] or ["FINISH"]
+
+    @staticmethod
+    def new_messages(state: CustomAgentState, result: dict) -> dict:
+        """
+        Keeps only the messages a worker added, so parallel workers merge their own
+        deltas (applied by LangGraph in node order) instead of full histories.
+        """
+        seen = {message.id for message in state["messages"]}
+        return {"messages": [message for message in result["messages"] if message.id not in seen]}
+
+    def create_worker_node(self, name: str):
+        terminal = self.registry.specs[name].terminal
+        pre_screen = self.registry.specs[name].pre_screen
+
+        async def call_worker(state: CustomAgentState) -> CustomAgentState:
+            # Pre-screens may map or compile menus, which must not block the event loop
+            if pre_screen is not None and (update := await asyncio.to_thread(pre_screen, state)) is not None:
+                return update
+            result = await run_subgraph(self.registry.get_graph(name), {"messages": state["messages"]}, name,
+                                        state.get("turn_started_at"))
+            if terminal:
+                self.finish_turn(state)
+            return self.new_messages(state, result)
+
+        return call_worker
 
     def create_supervisor_graph_agent(self):
         supervisor_builder = StateGraph(CustomAgentState)
 
-        # Add the supervisor node
-        supervisor_builder.add_node("supervisor", self.supervisor_node)
+        # Add the supervisor node and the finalizer ending turns that ran out of budget
+        supervisor_builder.add_node("supervisor", self.guard(self.supervisor_node))
+        supervisor_builder.add_node("Finalizer", self.finalizer_node)
 
-        # Add the worker nodes
-        supervisor_builder.add_node("Restaurant_Order_Worker", self.call_restaurant_agent)
-        supervisor_builder.add_node("Health_Profile_Worker", self.call_health_profile_agent)
-        supervisor_builder.add_node("Diet_Recommender_Worker", self.call_health_reviewer_agent)
-        supervisor_builder.add_node("General_LLM_Worker", self.call_fall_back_agent)
+        # Add the worker nodes, their graphs are built on first dispatch
+        for name in self.members:
+            supervisor_builder.add_node(name, self.guard(self.create_worker_node(name)))
 
         # Define the control flow
         supervisor_builder.add_edge(START, "supervisor")
-        supervisor_builder.add_conditional_edges("supervisor", lambda state: state["next"])
-        supervisor_builder.add_edge("Restaurant_Order_Worker", "supervisor")
-        supervisor_builder.add_edge("Health_Profile_Worker", "supervisor")
-        supervisor_builder.add_edge("Diet_Recommender_Worker", "supervisor")
-        supervisor_builder.add_edge("General_LLM_Worker", END)
+        # Several selected workers run as parallel branches and join back at the supervisor
+        supervisor_builder.add_conditional_edges("supervisor", lambda state: state["next"], self.members + ["Finalizer", END])
+        supervisor_builder.add_edge("Finalizer", END)
+        for name in self.members:
+            supervisor_builder.add_edge(name, END if self.registry.specs[name].terminal else "supervisor")
 
         # Compile the supervisor graph
-        supervisor_graph = supervisor_builder.compile(checkpointer=MemorySaver())
-        return supervisor_graph
+        supervisor_graph = supervisor_builder.compile(checkpointer=checkpointer)
+        # Sub-graph runs inherit the handler, so worker nodes, tools and LLM calls are timed too
+        return supervisor_graph.with_config(callbacks=[InstrumentationCallbackHandler(metrics)])
 
 # Instantiate the HealthyDietSupervisorAgent
 healthy_diet_supervisor = HealthyDietSupervisorAgent()
-supervisor_graph_agent = healthy_diet_supervisor.supervisor_graph_agent
\ No newline at end of file
+supervisor_graph_agent = healthy_diet_supervisor.supervisor_graph_agent
+
+metrics.register_collector("context_manager", context_manager.stats)
+metrics.register_collector("streaming", streaming_metrics.stats)
+if llm_cache is not None:
+    metrics.register_collector("llm_cache", llm_cache.stats)
+maybe_start_metrics_server()
\ No newline at end of file
@@ -1,29 +1,23 @@
 from langgraph.graph.message import MessagesState
-from langgraph.checkpoint.memory import MemorySaver
 from langgraph.graph import StateGraph, START, END
 from dotenv import load_dotenv
+from utilities.checkpointer import checkpointer
+from utilities.context_manager import context_manager
 from langchain_core.language_models.chat_models import BaseChatModel
-from utilities.llm_provider import llm
+from agents.prompts import general_llm_agent_prompt
 
 load_dotenv()
 
 class FallBackLLMAgent:
-    def __init__(self, llm: BaseChatModel, tools_json: dict = {}, agents: list= []):
+    def __init__(self, llm: BaseChatModel, system_prompt: str = general_llm_agent_prompt):
         self.llm = llm
         self.fall_back_graph = self.create_fallback_llm_graph_with_memory()
-        self.agents = agents
-        self.tools_json = tools_json
-        self.system_prompt = f"""You are a helpful assistant with agents: {self.agents} and tools: {tools_json}.
-        ### Interaction Guidelines:
-        - Confirm successful tool execution.
-        - Suggest relevant follow-up operations.
-        - Encourage exploring all tools.
-        """
+        self.system_prompt = system_prompt.strip()
 
     async def llm_node(self, state: MessagesState):
         messages = [
             {"role": "system", "content": self.system_prompt},
-        ] + state["messages"]
+        ] + context_manager.prepare("General_LLM_Worker", state["messages"])
         message = await self.llm.ainvoke(messages)
         state["messages"] = [message]
         return state
@@ -36,9 +30,5 @@ class FallBackLLMAgent:
         graph_builder.add_edge(START, "llm_node")
         graph_builder.add_edge("llm_node", END)
 
-        memory = MemorySaver()
-        graph = graph_builder.compile(checkpointer=memory)
+        graph = graph_builder.compile(checkpointer=checkpointer)
         return graph
-    
-llm_graph_agent_object = FallBackLLMAgent(llm=llm)
-llm_graph_agent = llm_graph_agent_object.fall_back_graph
\ No newline at end of file
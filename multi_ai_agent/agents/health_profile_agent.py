@@ -1,19 +1,18 @@
 from langgraph.graph.message import MessagesState
-from langgraph.checkpoint.memory import MemorySaver
 from langgraph.graph import StateGraph, START, END
 from langgraph.prebuilt import ToolNode
 from langgraph.prebuilt import tools_condition
-import json
 from dotenv import load_dotenv
+from utilities.checkpointer import checkpointer
+from utilities.context_manager import context_manager
 from langchain_core.language_models.chat_models import BaseChatModel
-from langchain_core.messages import HumanMessage
-from utilities.llm_provider import llm  # Assuming this is your LLM provider
+from langchain_core.messages import SystemMessage
+from utilities.profile_repository import profile_repository
+from utilities.thread_util import get_current_user_id
 
 load_dotenv()
 
-# Load health profile from mock JSON file
-with open("mock/user_health_profile.json", "r") as file:
-    health_profile = json.load(file)
+NO_PROFILE_MESSAGE = "No health profile is on file for this user, ask them about their health conditions instead."
 
 async def get_current_conditions() -> dict:
     """
@@ -22,8 +21,11 @@ async def get_current_conditions() -> dict:
         current_conditions: dict containing current health conditions
     """
     try:
+        health_profile = await profile_repository.aget(get_current_user_id())
         current_conditions = health_profile["user_health_profile"]["current_conditions"]
         return {"status": True, "data": current_conditions}
+    except KeyError:
+        return {"status": False, "data": NO_PROFILE_MESSAGE}
     except Exception as e:
         return {"status": False, "data": f"Error fetching current conditions: {str(e)}"}
 
@@ -34,8 +36,11 @@ async def get_past_conditions() -> dict:
         past_conditions: dict containing past health conditions
     """
     try:
+        health_profile = await profile_repository.aget(get_current_user_id())
         past_conditions = health_profile["user_health_profile"]["past_conditions"]
         return {"status": True, "data": past_conditions}
+    except KeyError:
+        return {"status": False, "data": NO_PROFILE_MESSAGE}
     except Exception as e:
         return {"status": False, "data": f"Error fetching past conditions: {str(e)}"}
 
@@ -46,51 +51,33 @@ async def get_dietary_restrictions() -> dict:
         restrictions: dict with combined dietary restrictions
     """
     try:
-        current_restrictions = []
-        past_restrictions = []
-        
-        # Get restrictions from current conditions
-        for condition in health_profile["user_health_profile"]["current_conditions"]:
-            current_restrictions.extend(condition["restrictions"])
-        
-        # Get restrictions from past conditions (might still be relevant)
-        for condition in health_profile["user_health_profile"]["past_conditions"]:
-            past_restrictions.extend(condition["restrictions"])
-        
-        combined_restrictions = {
-            "current_restrictions": list(set(current_restrictions)),  # Remove duplicates
-            "past_restrictions": list(set(past_restrictions)),      # Remove duplicates
-            "all_restrictions": list(set(current_restrictions + past_restrictions))
-        }
-        
+        # Derived once per profile version by the repository
+        combined_restrictions = await profile_repository.aget_restrictions(get_current_user_id())
         return {"status": True, "data": combined_restrictions}
+    except KeyError:
+        return {"status": False, "data": NO_PROFILE_MESSAGE}
     except Exception as e:
         return {"status": False, "data": f"Error fetching dietary restrictions: {str(e)}"}
 
+health_profile_tools = [
+    get_current_conditions,
+    get_past_conditions,
+    get_dietary_restrictions
+]
+
 class HealthProfileAgent:
     def __init__(self, llm: BaseChatModel, health_profile_agent_prompt: str):
         self.llm = llm
-        self.tools = [
-            get_current_conditions,
-            get_past_conditions,
-            get_dietary_restrictions
-        ]
+        self.tools = health_profile_tools
         self.llm_with_tools = self.llm.bind_tools(self.tools)
         self.health_graph_agent = self.create_health_graph_agent()
         self.health_system_prompt = health_profile_agent_prompt
-        self.agents = []
-        self.tools_json = {}
-
-    async def fromat_system_prompt(self, agents, tools_json):
-        self.agents = agents
-        self.tools_json = tools_json
-        self.health_system_prompt = self.health_system_prompt.format(agents=agents,tools_json=tools_json)
 
     async def health_tool_calling_llm(self, state: MessagesState):
-        system_message = HumanMessage(
+        system_message = SystemMessage(
             content=self.health_system_prompt
         )
-        message = await self.llm_with_tools.ainvoke([system_message] + state['messages'])
+        message = await self.llm_with_tools.ainvoke([system_message] + context_manager.prepare("Health_Profile_Worker", state['messages']))
         state['messages'] = [message]
         return state
 
@@ -104,8 +91,7 @@ class HealthProfileAgent:
         graph_builder.add_conditional_edges("tool_calling_llm", tools_condition)
         graph_builder.add_edge("tools", "tool_calling_llm")
         
-        memory = MemorySaver()
-        graph = graph_builder.compile(checkpointer=memory)
+        graph = graph_builder.compile(checkpointer=checkpointer)
         return graph
 
 # Create the health profile agent instance
@@ -1,48 +1,100 @@
 from langgraph.graph.message import MessagesState
-from langgraph.checkpoint.memory import MemorySaver
 from langgraph.graph import StateGraph, START, END
 from langgraph.prebuilt import ToolNode
 from langgraph.prebuilt import tools_condition
-import json
+import asyncio
 from dotenv import load_dotenv
+from utilities.checkpointer import checkpointer
+from utilities.context_manager import context_manager
 from langchain_core.language_models.chat_models import BaseChatModel
-from langchain_core.messages import HumanMessage
-from utilities.llm_provider import llm  # Assuming this is your LLM provider
+from langchain_core.messages import SystemMessage
+from typing import Optional
+from utilities.menu_catalog import menu_catalog
+from utilities.order_store import order_store
+from utilities.thread_util import get_current_thread_id, get_current_user_id
 
 load_dotenv()
 
-# Mock menu data (in real scenario, this would be loaded from a JSON file)
-with open("mock/south_indian_veg_menu.json", "r") as file:
-    menu_data = json.load(file)
 
-# Store orders in memory (simulating a database)
-orders_history = []
+async def list_restaurants() -> dict:
+    """
+    This function lists the restaurants users can order from.
+    Output:
+        restaurants: list of dicts with restaurant_id, restaurant name and item_count
+    """
+    try:
+        return {"status": True, "data": await menu_catalog.arestaurants()}
+    except Exception as e:
+        return {"status": False, "data": f"Error listing restaurants: {str(e)}"}
 
-async def get_menu() -> dict:
+async def get_menu(restaurant_id: Optional[str] = None) -> dict:
     """
-    This function retrieves the South Indian vegetarian restaurant menu.
+    This function retrieves an overview of a restaurant's menu.
+    Use search_menu or get_items for item descriptions and health tags.
+    Args:
+        restaurant_id: id from list_restaurants, defaults to the South Indian vegetarian restaurant
     Output:
-        menu_data: dict containing menu items
+        menu: dict with restaurant name, price range, available health tags and items (id, name, price)
     """
     try:
-        return {"status": True, "data": menu_data}
+        compiled_menu = await menu_catalog.aget(restaurant_id)
+        menu = compiled_menu.summary()
+        menu["items"] = compiled_menu.overview()
+        return {"status": True, "data": menu}
     except Exception as e:
         return {"status": False, "data": f"Error fetching menu: {str(e)}"}
 
-async def place_order(order_items: list, is_diet_recommended: bool = False) -> dict:
+async def search_menu(query: str = "", tags: Optional[list] = None, max_price: Optional[float] = None, limit: int = 10,
+                      restaurant_id: Optional[str] = None) -> dict:
+    """
+    This function searches the menu and returns only the matching items.
+    Args:
+        query: words to match against item names and descriptions, e.g. "dosa"
+        tags: health tags every item must have, e.g. ["diabetes", "digestion", "high-fiber"]
+        max_price: maximum item price
+        limit: maximum number of items to return
+        restaurant_id: id from list_restaurants, defaults to the South Indian vegetarian restaurant
+    Output:
+        items: list of matching menu items
+    """
+    try:
+        menu = await menu_catalog.aget(restaurant_id)
+        # The first search of a menu builds its token index
+        return {"status": True, "data": await asyncio.to_thread(menu.search, query, tags, max_price, limit)}
+    except Exception as e:
+        return {"status": False, "data": f"Error searching menu: {str(e)}"}
+
+async def get_items(ids: list, restaurant_id: Optional[str] = None) -> dict:
+    """
+    This function retrieves the menu items with the given ids.
+    Args:
+        ids: list of item ids, e.g. ["SI04", "SI09"]
+        restaurant_id: id from list_restaurants, defaults to the South Indian vegetarian restaurant
+    Output:
+        items: list of menu items found
+    """
+    try:
+        menu = await menu_catalog.aget(restaurant_id)
+        items = menu.get_many(ids)
+        missing = [item_id for item_id in ids if menu.row_of(item_id) is None]
+        return {"status": True, "data": {"items": items, "not_found": missing}}
+    except Exception as e:
+        return {"status": False, "data": f"Error fetching items: {str(e)}"}
+
+async def place_order(order_items: list, is_diet_recommended: bool = False, restaurant_id: Optional[str] = None) -> dict:
     """
     This function places an order with the specified items.
     Args:
         order_items: list of dicts containing item_id and quantity
         is_diet_recommended: is the items in the order are recommended?
+        restaurant_id: id from list_restaurants, defaults to the South Indian vegetarian restaurant
     Output:
         order_confirmation: dict with order details
     """
     try:
+        menu = await menu_catalog.aget(restaurant_id)
         if not is_diet_recommended:
             return {"status": False, "data": "The ordered items are not recommended for you diet, please order the recommended items based on you health."}
-        # Validate items against menu
-        available_items = {item["id"]: item for item in menu_data["items"]}
         order_total = 0
         order_details = []
         
@@ -50,13 +102,14 @@ async def place_order(order_items: list, is_diet_recommended: bool = False) -> d
             item_id = order_item.get("item_id")
             quantity = order_item.get("quantity", 1)
             
-            if item_id not in available_items:
+            item = menu.get(item_id)
+            if item is None:
                 return {"status": False, "data": f"Item {item_id} not found in menu"}
             
-            item = available_items[item_id]
             item_total = item["price"] * quantity
             order_total += item_total
             order_details.append({
+                "restaurant_id": menu.restaurant_id,
                 "item_id": item_id,
                 "name": item["name"],
                 "quantity": quantity,
@@ -64,19 +117,18 @@ async def place_order(order_items: list, is_diet_recommended: bool = False) -> d
                 "total": item_total
             })
         
-        order_id = f"ORD{len(orders_history) + 1:04d}"
-        order = {
-            "order_id": order_id,
-            "items": order_details,
-            "total_amount": order_total,
-            "timestamp": "2025-04-01"  # Using current date from your context
-        }
-        
-        orders_history.append(order)
+        # BEGIN IMMEDIATE may wait for other writers, which must not block the event loop
+        order = await asyncio.to_thread(
+            order_store.place,
+            user_id=get_current_user_id(),
+            thread_id=get_current_thread_id(),
+            items=order_details,
+            total_amount=order_total,
+        )
         return {
             "status": True,
             "data": {
-                "order_id": order_id,
+                "order_id": order["order_id"],
                 "message": "Order placed successfully",
                 "details": order
             }
@@ -84,43 +136,45 @@ async def place_order(order_items: list, is_diet_recommended: bool = False) -> d
     except Exception as e:
         return {"status": False, "data": f"Error placing order: {str(e)}"}
 
-async def get_order_history() -> dict:
+async def get_order_history(limit: int = 10, cursor: Optional[str] = None) -> dict:
     """
-    This function retrieves all previous orders.
+    This function retrieves the user's previous orders, newest first.
+    Args:
+        limit: maximum number of orders to return
+        cursor: next_cursor from a previous call, to fetch older orders
     Output:
-        orders_history: dict containing all past orders
+        orders_history: dict with orders and next_cursor (None when there are no older orders)
     """
     try:
-        if not orders_history:
+        orders_history = await asyncio.to_thread(order_store.history, get_current_user_id(), limit=limit, cursor=cursor)
+        if not orders_history["orders"] and not cursor:
             return {"status": True, "data": "No orders placed yet"}
         return {"status": True, "data": orders_history}
     except Exception as e:
         return {"status": False, "data": f"Error fetching order history: {str(e)}"}
 
+restaurant_tools = [
+    list_restaurants,
+    get_menu,
+    search_menu,
+    get_items,
+    place_order,
+    get_order_history
+]
+
 class RestaurantAgent:
     def __init__(self, llm: BaseChatModel, restaurant_agent_prompt:str):
         self.llm = llm
-        self.tools = [
-            get_menu,
-            place_order,
-            get_order_history
-        ]
+        self.tools = restaurant_tools
         self.llm_with_tools = self.llm.bind_tools(self.tools)
         self.restaurant_graph_agent = self.create_restaurant_graph_agent()
         self.restaurant_system_prompt = restaurant_agent_prompt
-        self.agents = []
-        self.tools_json = {}
-
-    async def fromat_system_prompt(self, agents, tools_json):
-        self.agents = agents
-        self.tools_json = tools_json
-        self.restaurant_system_prompt = self.restaurant_system_prompt.format(agents=agents,tools_json=tools_json)
 
     async def restaurant_tool_calling_llm(self, state: MessagesState):
-        system_message = HumanMessage(
+        system_message = SystemMessage(
             content=self.restaurant_system_prompt
         )
-        message = await self.llm_with_tools.ainvoke([system_message] + state['messages'])
+        message = await self.llm_with_tools.ainvoke([system_message] + context_manager.prepare("Restaurant_Order_Worker", state['messages']))
         state['messages'] = [message]
         return state
 
@@ -134,8 +188,7 @@ class RestaurantAgent:
         graph_builder.add_conditional_edges("tool_calling_llm", tools_condition)
         graph_builder.add_edge("tools", "tool_calling_llm")
         
-        memory = MemorySaver()
-        graph = graph_builder.compile(checkpointer=memory)
+        graph = graph_builder.compile(checkpointer=checkpointer)
         return graph
 
 # Create the restaurant agent instance
@@ -0,0 +1,140 @@
+import json
+import logging
+import os
+import re
+from typing import List, NamedTuple, Optional, Union
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from agents.worker_registry import WorkerRegistry
+
+logger = logging.getLogger(__name__)
+
+SMALL_TALK_PATTERN = r"^\s*(hi|hello|hey|thanks|thank you|good (morning|afternoon|evening))\b"
+
+
+class RouteDecision(NamedTuple):
+    next: Optional[Union[str, List[str]]]
+    confidence: float
+    reason: str
+
+
+class RuleBasedRouter:
+    """
+    Cheap deterministic pre-router for the supervisor, driven by the intents, prefetch
+    and finishing tools of the registered workers. It routes a new user message when
+    the intents are clear and ends a turn once a finishing tool succeeded, or once the
+    only intended worker answered from its read-only tools; every other decision after
+    a worker ran (orders, multiple intents, failed tools) is left to the LLM. The
+    supervisor only skips the LLM when the confidence is high enough. In shadow mode
+    the LLM always decides and the rule decision is only compared.
+    """
+
+    def __init__(self, registry: WorkerRegistry, confidence_threshold: float = 0.8, shadow_mode: bool = False):
+        self.registry = registry
+        self.members = registry.names
+        self.intent_patterns = {spec.name: re.compile(spec.intent_pattern, re.IGNORECASE)
+                                for spec in registry.specs.values() if spec.intent_pattern}
+        self.finishing_tools = {tool for spec in registry.specs.values() for tool in spec.finishing_tools}
+        self.answer_tools = {spec.name: set(spec.answer_tools) for spec in registry.specs.values()}
+        self.action_patterns = {spec.name: re.compile(spec.action_pattern, re.IGNORECASE)
+                                for spec in registry.specs.values() if spec.action_pattern}
+        self.small_talk_pattern = re.compile(SMALL_TALK_PATTERN, re.IGNORECASE)
+        self.confidence_threshold = confidence_threshold
+        self.shadow_mode = shadow_mode
+        self.shadow_total = 0
+        self.shadow_agreements = 0
+
+    def match_intents(self, text: str) -> List[str]:
+        return [worker for worker, pattern in self.intent_patterns.items() if pattern.search(text)]
+
+    @staticmethod
+    def _latest_human_index(messages) -> Optional[int]:
+        for index in range(len(messages) - 1, -1, -1):
+            if isinstance(messages[index], HumanMessage):
+                return index
+        return None
+
+    @staticmethod
+    def _tool_succeeded(message: ToolMessage) -> bool:
+        try:
+            return bool(json.loads(message.content).get("status"))
+        except (TypeError, ValueError, AttributeError):
+            return False
+
+    def _answered(self, intents: List[str], last_workers: List[str], human_text: str, turn_messages) -> bool:
+        """
+        Whether the only intended worker answered a single-intent, non-action request
+        with read-only tool results that all succeeded.
+        """
+        if len(intents) != 1 or last_workers != intents:
+            return False
+        worker = intents[0]
+        action_pattern = self.action_patterns.get(worker)
+        if action_pattern is not None and action_pattern.search(human_text):
+            return False
+        results = [m for m in turn_messages if isinstance(m, ToolMessage)]
+        return bool(results) and all(m.name in self.answer_tools[worker] and self._tool_succeeded(m) for m in results)
+
+    def route(self, state) -> RouteDecision:
+        messages = state.get("messages", [])
+        human_index = self._latest_human_index(messages)
+        if human_index is None:
+            return RouteDecision(None, 0.0, "no human message")
+        human_text = messages[human_index].content if isinstance(messages[human_index].content, str) else ""
+        intents = self.match_intents(human_text)
+        last_message = messages[-1]
+
+        if isinstance(last_message, HumanMessage):
+            if len(intents) == 1:
+                return RouteDecision(intents[0], 0.9, f"intent matched {intents[0]}")
+            deferred = [worker for worker in intents if self.registry.specs[worker].deferred]
+            if len(deferred) == 1 and set(intents) - set(deferred) <= set(self.registry.specs[deferred[0]].prefetch):
+                # The deferred worker needs the results of its prefetch workers, fetch them in parallel first
+                prefetch = [worker for worker in self.members if worker in self.registry.specs[deferred[0]].prefetch]
+                return RouteDecision(prefetch, 0.85, f"prefetch for {deferred[0]}")
+            if len(intents) > 1 and not deferred:
+                return RouteDecision(intents, 0.85, "independent intents matched")
+            if not intents and self.registry.fallback_worker and self.small_talk_pattern.search(human_text):
+                return RouteDecision(self.registry.fallback_worker, 0.9, "small talk")
+            return RouteDecision(None, 0.0, f"ambiguous intent {intents}")
+
+        last_workers = state.get("next") or []
+        if isinstance(last_workers, str):
+            last_workers = [last_workers]
+        if not last_workers or any(worker not in self.members for worker in last_workers) \
+                or not isinstance(last_message, AIMessage) or last_message.tool_calls:
+            return RouteDecision(None, 0.0, "no completed worker turn")
+        finished = [m.name for m in messages[human_index + 1:]
+                    if isinstance(m, ToolMessage) and m.name in self.finishing_tools and self._tool_succeeded(m)]
+        if finished:
+            return RouteDecision("FINISH", 0.95, f"{finished[-1]} succeeded")
+        if self._answered(intents, last_workers, human_text, messages[human_index + 1:]):
+            return RouteDecision("FINISH", 0.9, f"{last_workers[0]} answered from read-only tools")
+        # Whether the workers answered the request, or another worker (e.g. a review) is due, is for the LLM to judge
+        return RouteDecision(None, 0.0, f"{last_workers} finished, intents {intents}")
+
+    def is_confident(self, decision: RouteDecision) -> bool:
+        return not self.shadow_mode and decision.next is not None and decision.confidence >= self.confidence_threshold
+
+    def observe(self, decision: RouteDecision, llm_decision: Optional[str]):
+        if not self.shadow_mode or decision.next is None:
+            return
+        self.shadow_total += 1
+        as_set = lambda value: {value} if isinstance(value, str) else set(value or [])
+        agreed = as_set(decision.next) == as_set(llm_decision)
+        self.shadow_agreements += agreed
+        logger.info(
+            "fast router shadow: rule=%s (%.2f, %s) llm=%s agree=%s agreement_rate=%.2f",
+            decision.next, decision.confidence, decision.reason, llm_decision, agreed,
+            self.shadow_agreements / self.shadow_total,
+        )
+
+
+def create_rule_router(registry: WorkerRegistry) -> Optional[RuleBasedRouter]:
+    mode = os.getenv("FAST_ROUTER_MODE", "on").lower()
+    if mode == "off":
+        return None
+    return RuleBasedRouter(
+        registry,
+        confidence_threshold=float(os.getenv("FAST_ROUTER_CONFIDENCE", "0.8")),
+        shadow_mode=mode == "shadow",
+    )
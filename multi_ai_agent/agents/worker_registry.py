@@ -0,0 +1,155 @@
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+from langchain_core.language_models.chat_models import BaseChatModel
+from utilities.llm_provider import get_llm
+from utilities.prompt_compiler import PromptCompiler, build_tool_catalog
+from agents.prompts import restaurant_agent_prompt, health_profile_agent_prompt, diet_recommender_agent_prompt, general_llm_agent_prompt
+from agents.restaurant_agent import RestaurantAgent, restaurant_tools
+from agents.health_profile_agent import HealthProfileAgent, health_profile_tools
+from agents.diet_recommender_agent import diet_recommender_tools, create_diet_recommender_agent, prescreen_order
+from agents.fall_back_llm_agent import FallBackLLMAgent
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerSpec(NamedTuple):
+    """
+    A worker the supervisor can dispatch to. `factory(llm, system_prompt)` builds its
+    compiled graph and is only called on the first dispatch. A `terminal` worker ends
+    the turn and is the fallback when no other worker matches; a `deferred` worker
+    waits until the other workers selected with it have run. A `pre_screen(state)` hook
+    may answer without the graph by returning the worker's update, or None to run it.
+    The rule router dispatches to the worker when `intent_pattern` matches the user's
+    message, first running the `prefetch` workers it needs results from, and ends the
+    turn once one of its `finishing_tools` succeeded. When the worker was the only
+    intent of the message, the message is not an `action_pattern` request (e.g. an
+    order) and only its read-only `answer_tools` ran and succeeded, its final answer
+    ends the turn as well.
+    """
+    name: str
+    capabilities: str
+    tools: List[Callable]
+    prompt: str
+    factory: Callable[[BaseChatModel, str], Any]
+    include_catalog: bool = True
+    terminal: bool = False
+    deferred: bool = False
+    pre_screen: Optional[Callable[[dict], Optional[dict]]] = None
+    intent_pattern: Optional[str] = None
+    prefetch: Tuple[str, ...] = ()
+    finishing_tools: Tuple[str, ...] = ()
+    answer_tools: Tuple[str, ...] = ()
+    action_pattern: Optional[str] = None
+
+
+class WorkerRegistry:
+    def __init__(self, specs: Optional[List[WorkerSpec]] = None):
+        self.specs: Dict[str, WorkerSpec] = {}
+        self.graphs: Dict[str, Any] = {}
+        self.build_seconds: Dict[str, float] = {}
+        self.lock = threading.Lock()
+        self._prompt_compiler: Optional[PromptCompiler] = None
+        for spec in specs or []:
+            self.register(spec)
+
+    def register(self, spec: WorkerSpec):
+        if spec.name in self.specs:
+            raise ValueError(f"worker {spec.name} is already registered")
+        self.specs[spec.name] = spec
+        self._prompt_compiler = None
+
+    @property
+    def names(self) -> List[str]:
+        return list(self.specs)
+
+    @property
+    def fallback_worker(self) -> Optional[str]:
+        return next((spec.name for spec in self.specs.values() if spec.terminal), None)
+
+    @property
+    def prompt_compiler(self) -> PromptCompiler:
+        """Compiles every worker's system prompt against the current catalog; cheap, no graph is built."""
+        if self._prompt_compiler is None:
+            prompt_compiler = PromptCompiler(build_tool_catalog(self.specs.values()))
+            for spec in self.specs.values():
+                prompt_compiler.compile(spec.name, spec.prompt, include_catalog=spec.include_catalog)
+            self._prompt_compiler = prompt_compiler
+        return self._prompt_compiler
+
+    def get_graph(self, name: str):
+        """Compiled graph of the worker, built on its first dispatch."""
+        graph = self.graphs.get(name)
+        if graph is not None:
+            return graph
+        with self.lock:
+            if name not in self.graphs:
+                spec = self.specs[name]
+                started = time.perf_counter()
+                self.graphs[name] = spec.factory(get_llm(), self.prompt_compiler.prompts[name].text)
+                self.build_seconds[name] = time.perf_counter() - started
+                logger.info("built worker %s in %.3fs", name, self.build_seconds[name])
+            return self.graphs[name]
+
+    def report(self) -> Dict[str, dict]:
+        prompts = self.prompt_compiler.prompts
+        report = {
+            name: {
+                "tools": [tool.__name__ for tool in spec.tools],
+                "prompt_tokens": prompts[name].tokens,
+                "built": name in self.graphs,
+                "build_seconds": self.build_seconds.get(name),
+            }
+            for name, spec in self.specs.items()
+        }
+        logger.info("worker registry: %s", report)
+        return report
+
+
+worker_registry = WorkerRegistry([
+    WorkerSpec(
+        name="Restaurant_Order_Worker",
+        capabilities="menu overview and search, item details, placing orders and order history",
+        tools=restaurant_tools,
+        prompt=restaurant_agent_prompt,
+        factory=lambda llm, prompt: RestaurantAgent(llm, prompt).restaurant_graph_agent,
+        intent_pattern=r"\b(menu|order|orders|dish|dishes|buy|price|prices|cost)\b",
+        finishing_tools=("place_order",),
+        answer_tools=("list_restaurants", "get_menu", "search_menu", "get_items", "get_order_history"),
+        # Orders may still need a diet review or a confirmation, which the LLM decides on
+        action_pattern=r"\b(order|buy|get me|i'll have|i will have)\b",
+    ),
+    WorkerSpec(
+        name="Health_Profile_Worker",
+        capabilities="the user's current and past health conditions and dietary restrictions",
+        tools=health_profile_tools,
+        prompt=health_profile_agent_prompt,
+        factory=lambda llm, prompt: HealthProfileAgent(llm, prompt).health_graph_agent,
+        intent_pattern=r"\b(conditions?|health profile|restrictions?|allerg\w*|diagnos\w*|medical)\b",
+        answer_tools=("get_current_conditions", "get_past_conditions", "get_dietary_restrictions"),
+    ),
+    WorkerSpec(
+        name="Diet_Recommender_Worker",
+        capabilities="reviewing a food order against the user's health profile and recommending menu items",
+        tools=diet_recommender_tools,
+        prompt=diet_recommender_agent_prompt,
+        factory=create_diet_recommender_agent,
+        # Only needs its own tools, which are bound to the model
+        include_catalog=False,
+        deferred=True,
+        # Clear approvals and rejections are decided by the rule engine without an LLM call
+        pre_screen=prescreen_order,
+        intent_pattern=r"\b(healthy|healthier|recommend\w*|suitable|diet|(should|can) i eat)\b",
+        # A review needs the user's restrictions and the menu
+        prefetch=("Health_Profile_Worker", "Restaurant_Order_Worker"),
+    ),
+    WorkerSpec(
+        name="General_LLM_Worker",
+        capabilities="general conversation and anything the specialized workers do not cover",
+        tools=[],
+        prompt=general_llm_agent_prompt,
+        factory=lambda llm, prompt: FallBackLLMAgent(llm, prompt).fall_back_graph,
+        terminal=True,
+    ),
+])
@@ -0,0 +1,87 @@
+"""
+Re-validates placed orders against the users' current health profiles, e.g. nightly
+after profiles changed, with the diet rule engine instead of one LLM review per order.
+
+    cd multi_ai_agent
+    python -m batch.revalidate_orders --since 2026-01-01 --output revalidation.jsonl
+
+Orders are read in pages from the order store and scored per restaurant in batches of
+`--batch-size` with one restriction mask per user. Every verdict is written to the
+output JSONL; orders of users without a health profile are reported as "no_profile".
+"""
+import argparse
+import json
+import logging
+import time
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def order_restaurant(order: dict) -> Optional[str]:
+    # Orders placed before the multi-restaurant catalog carry no restaurant_id: the default restaurant
+    return next((item.get("restaurant_id") for item in order["items"] if item.get("restaurant_id")), None)
+
+
+def revalidate(orders: Iterable[dict], batch_size: int = 1000) -> Iterable[dict]:
+    """Yields one verdict record per order, scoring each restaurant's pending orders in one evaluate_batch call."""
+    from agents.diet_recommender_agent import get_rule_engine
+    from utilities.profile_repository import profile_repository
+
+    restrictions: Dict[str, Optional[dict]] = {}
+    pending: Dict[Optional[str], List[dict]] = defaultdict(list)
+
+    def restrictions_for(user_id: str) -> Optional[dict]:
+        if user_id not in restrictions:
+            try:
+                restrictions[user_id] = profile_repository.get_restrictions(user_id)
+            except KeyError:
+                restrictions[user_id] = None
+        return restrictions[user_id]
+
+    def flush(restaurant_id: Optional[str]):
+        orders = pending.pop(restaurant_id, [])
+        verdicts = get_rule_engine(restaurant_id).evaluate_batch(
+            [(order["user_id"], order["items"]) for order in orders], restrictions_for)
+        for order, verdict in zip(orders, verdicts):
+            yield {
+                "order_id": order["order_id"],
+                "user_id": order["user_id"],
+                "restaurant_id": restaurant_id,
+                "decision": verdict.decision,
+                "reason": verdict.reason,
+                "items": verdict.items,
+                "unmapped_restrictions": verdict.unmapped_restrictions,
+            }
+
+    for order in orders:
+        if restrictions_for(order["user_id"]) is None:
+            yield {"order_id": order["order_id"], "user_id": order["user_id"], "decision": "no_profile"}
+            continue
+        restaurant_id = order_restaurant(order)
+        pending[restaurant_id].append(order)
+        if len(pending[restaurant_id]) >= batch_size:
+            yield from flush(restaurant_id)
+    for restaurant_id in list(pending):
+        yield from flush(restaurant_id)
+
+
+if __name__ == "__main__":
+    from utilities.order_store import order_store
+
+    parser = argparse.ArgumentParser(description="Re-validate placed orders against the current health profiles")
+    parser.add_argument("--since", default=None, help="only orders created at or after this ISO timestamp")
+    parser.add_argument("--output", default="revalidation.jsonl", help="JSONL file of the verdicts")
+    parser.add_argument("--batch-size", type=int, default=1000, help="orders scored per rule engine call")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    decisions = Counter()
+    with open(args.output, "w") as output_file:
+        for record in revalidate(order_store.iter_orders(since=args.since, batch_size=args.batch_size), args.batch_size):
+            decisions[record["decision"]] += 1
+            output_file.write(json.dumps(record) + "\n")
+    summary = {"orders": sum(decisions.values()), "decisions": dict(decisions), "elapsed_seconds": time.perf_counter() - started}
+    logger.warning("revalidation finished: %s", summary)
+    print(json.dumps(summary, indent=2))
@@ -0,0 +1,242 @@
+"""
+Replays recorded conversations from a JSONL file through the supervisor graph.
+
+    cd multi_ai_agent
+    python -m batch.run_conversations conversations.jsonl --output results.jsonl --concurrency 16 --processes 4
+
+Each input line is {"id": "...", "user_id": "...", "turns": ["first user message", ...]}
+("messages" with {"role": "user", "content": ...} entries is accepted instead of "turns").
+Every finished conversation is appended to the output JSONL at once, and the progress file
+next to it records how far the input has been processed, so rerunning the same command
+after a crash skips the conversations already done. Orders placed by the replayed
+conversations go to a separate order store next to the output (`--order-db`), never to
+the ORDER_DB_PATH of the application.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+import zlib
+from typing import Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+def conversation_turns(conversation: dict) -> list:
+    if "turns" in conversation:
+        return list(conversation["turns"])
+    return [message["content"] for message in conversation.get("messages", []) if message.get("role") in ("user", "human")]
+
+
+def shard_of(conversation_id: str, shards: int) -> int:
+    # crc32 is stable across processes and runs, unlike hash()
+    return zlib.crc32(conversation_id.encode("utf-8")) % shards
+
+
+def load_completed_ids(output_path: str) -> Set[str]:
+    """Ids already in the output. A line cut off by a crash is truncated so the file stays valid JSONL."""
+    completed = set()
+    if not os.path.exists(output_path):
+        return completed
+    with open(output_path, "rb+") as file:
+        valid_size = 0
+        for line in file:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                completed.add(json.loads(line)["id"])
+            except (ValueError, KeyError):
+                break
+            valid_size += len(line)
+        file.truncate(valid_size)
+    return completed
+
+
+class ProgressTracker:
+    """
+    Input offset below which every conversation is finished (a low-water mark, since
+    conversations complete out of order), written atomically every `save_every` results.
+    """
+
+    def __init__(self, path: str, input_path: str, save_every: int = 50):
+        self.path = path
+        self.input_path = input_path
+        self.save_every = save_every
+        self.pending = {}
+        self.read_offset = 0
+        self.completed = 0
+        self.failed = 0
+        self.unsaved = 0
+
+    def load_offset(self) -> int:
+        try:
+            with open(self.path) as file:
+                progress = json.load(file)
+        except (OSError, ValueError):
+            return 0
+        if progress.get("input") != os.path.abspath(self.input_path):
+            return 0
+        return progress.get("offset", 0)
+
+    @property
+    def offset(self) -> int:
+        return min(self.pending.values()) if self.pending else self.read_offset
+
+    def started(self, conversation_id: str, offset: int):
+        self.pending[conversation_id] = offset
+
+    def finished(self, conversation_id: str, ok: bool):
+        self.pending.pop(conversation_id, None)
+        self.completed += ok
+        self.failed += not ok
+        self.unsaved += 1
+        if self.unsaved >= self.save_every:
+            self.save()
+
+    def save(self):
+        progress = {
+            "input": os.path.abspath(self.input_path),
+            "offset": self.offset,
+            "completed": self.completed,
+            "failed": self.failed,
+            "updated_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        }
+        temporary_path = f"{self.path}.tmp"
+        with open(temporary_path, "w") as file:
+            json.dump(progress, file)
+        os.replace(temporary_path, self.path)
+        self.unsaved = 0
+
+
+async def run_conversation(graph, conversation: dict, thread_id: str, timeout_seconds: Optional[float]) -> dict:
+    from utilities.checkpointer import checkpointer
+
+    # A conversation interrupted by a crash is replayed from scratch on the same thread
+    await checkpointer.adelete_thread(thread_id)
+    configurable = {"thread_id": thread_id}
+    if conversation.get("user_id"):
+        configurable["user_id"] = conversation["user_id"]
+    started = time.perf_counter()
+    turns = []
+    for text in conversation_turns(conversation):
+        turn_started = time.perf_counter()
+        state = await asyncio.wait_for(
+            graph.ainvoke({"messages": [("user", text)]}, {"configurable": configurable}), timeout_seconds)
+        turns.append({
+            "input": text,
+            "output": state["messages"][-1].content,
+            "latency_ms": (time.perf_counter() - turn_started) * 1000,
+            "hops": state.get("hop_count"),
+            "exhausted_budget": state.get("exhausted_budget"),
+        })
+    return {"turns": turns, "elapsed_ms": (time.perf_counter() - started) * 1000}
+
+
+async def run_batch(args) -> dict:
+    # Replayed place_order calls run under real user ids, so they must not reach the real order store
+    os.environ["ORDER_DB_PATH"] = args.order_db or f"{args.output}.orders.sqlite"
+    from utilities.thread_util import new_thread
+
+    if args.fake_llm:
+        from utilities.llm_provider import set_llm
+        from benchmarks.fake_chat_model import ScriptedChatModel
+        set_llm(ScriptedChatModel())
+    from agents.diet_supervisor_agent import supervisor_graph_agent
+
+    completed_ids = load_completed_ids(args.output)
+    progress = ProgressTracker(f"{args.output}.progress", args.input)
+    start_offset = progress.load_offset()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=args.concurrency * 2)
+
+    async def produce():
+        with open(args.input, "rb") as file:
+            file.seek(start_offset)
+            progress.read_offset = start_offset
+            while line := file.readline():
+                offset = progress.read_offset
+                progress.read_offset += len(line)
+                if not line.strip():
+                    continue
+                conversation = json.loads(line)
+                conversation_id = str(conversation["id"])
+                if conversation_id in completed_ids or (args.shards > 1 and shard_of(conversation_id, args.shards) != args.shard_index):
+                    continue
+                progress.started(conversation_id, offset)
+                await queue.put(conversation)
+        for _ in range(args.concurrency):
+            await queue.put(None)
+
+    async def work(output_file):
+        while (conversation := await queue.get()) is not None:
+            conversation_id = str(conversation["id"])
+            # Deterministic per run name and conversation, so a resumed run reuses the thread
+            thread_id = new_thread(f"{args.run_name}:{conversation_id}")
+            record = {"id": conversation_id, "thread_id": thread_id, "shard": args.shard_index}
+            try:
+                record.update(await run_conversation(supervisor_graph_agent, conversation, thread_id, args.timeout_seconds))
+                record["status"] = "ok"
+            except Exception as e:
+                logger.warning("conversation %s failed: %s", conversation_id, e)
+                record.update({"status": "error", "error": f"{type(e).__name__}: {e}"})
+            output_file.write(json.dumps(record, default=str) + "\n")
+            output_file.flush()
+            progress.finished(conversation_id, record["status"] == "ok")
+
+    started = time.perf_counter()
+    with open(args.output, "a") as output_file:
+        await asyncio.gather(produce(), *[work(output_file) for _ in range(args.concurrency)])
+    progress.save()
+    summary = {
+        "shard": args.shard_index,
+        "completed": progress.completed,
+        "failed": progress.failed,
+        "skipped_already_done": len(completed_ids),
+        "elapsed_seconds": time.perf_counter() - started,
+    }
+    logger.warning("batch finished: %s", summary)
+    return summary
+
+
+def run_sharded(args) -> int:
+    """Runs one child process per shard, each with its own output, progress and checkpoint files."""
+    from utilities.checkpointer import DEFAULT_DB_PATH
+
+    checkpoint_db = os.getenv("CHECKPOINT_DB_PATH", DEFAULT_DB_PATH)
+    children = []
+    for shard_index in range(args.processes):
+        command = [sys.executable, "-m", "batch.run_conversations", args.input,
+                   "--output", f"{args.output}.shard{shard_index}",
+                   "--concurrency", str(args.concurrency),
+                   "--shards", str(args.processes), "--shard-index", str(shard_index),
+                   "--run-name", args.run_name]
+        if args.timeout_seconds:
+            command += ["--timeout-seconds", str(args.timeout_seconds)]
+        if args.order_db:
+            command += ["--order-db", f"{args.order_db}.shard{shard_index}"]
+        if args.fake_llm:
+            command.append("--fake-llm")
+        environment = {**os.environ, "CHECKPOINT_DB_PATH": f"{checkpoint_db}.shard{shard_index}"}
+        children.append(subprocess.Popen(command, env=environment))
+    return max(child.wait() for child in children)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay recorded conversations through the supervisor graph")
+    parser.add_argument("input", help="JSONL file with one conversation per line")
+    parser.add_argument("--output", default="batch_results.jsonl", help="JSONL results, appended as conversations finish")
+    parser.add_argument("--concurrency", type=int, default=8, help="conversations run concurrently per process")
+    parser.add_argument("--processes", type=int, default=1, help="shard the input across this many processes")
+    parser.add_argument("--shards", type=int, default=1, help=argparse.SUPPRESS)
+    parser.add_argument("--shard-index", type=int, default=0, help=argparse.SUPPRESS)
+    parser.add_argument("--run-name", default="batch", help="namespace of the deterministic thread ids")
+    parser.add_argument("--timeout-seconds", type=float, default=None, help="timeout of a single turn")
+    parser.add_argument("--order-db", default=None, help="order store of the replayed conversations, <output>.orders.sqlite by default")
+    parser.add_argument("--fake-llm", action="store_true", help="use the scripted benchmark model instead of OpenAI")
+    args = parser.parse_args()
+    if args.processes > 1:
+        sys.exit(run_sharded(args))
+    asyncio.run(run_batch(args))
@@ -0,0 +1,113 @@
+import asyncio
+import json
+import time
+import uuid
+from typing import Any, Callable, List, Optional
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from utilities.context_manager import count_text_tokens, count_tokens
+
+
+def _tool_call(name: str, args: dict) -> AIMessage:
+    return AIMessage(content="", tool_calls=[{"name": name, "args": args, "id": f"call_{uuid.uuid4().hex[:12]}"}])
+
+
+def _turn_messages(messages: List[BaseMessage]):
+    """
+    The latest user message, the tool results produced since it and whether the order
+    was reviewed, by the diet recommender tool or by the diet rule engine.
+    """
+    for index in range(len(messages) - 1, -1, -1):
+        message = messages[index]
+        if isinstance(message, HumanMessage) and not isinstance(message, SystemMessage):
+            turn = messages[index + 1:]
+            tools_used = [m.name for m in turn if isinstance(m, ToolMessage)]
+            reviewed = "get_menu_compatibility" in tools_used or any(
+                isinstance(m, AIMessage) and str(m.content).startswith("Diet review:") for m in turn)
+            return message.content.lower(), tools_used, reviewed
+    return "", [], False
+
+
+def scripted_reply(messages: List[BaseMessage], tool_names: List[str]) -> AIMessage:
+    """
+    Deterministic stand-in for the OpenAI model that walks the canned benchmark
+    scenarios: routing decisions for the supervisor's Router schema, tool calls for
+    the workers and short text answers once a tool result is available.
+    """
+    user_text, tools_used, reviewed = _turn_messages(messages)
+    wants_order = "order" in user_text and "healthy" in user_text
+
+    if "Router" in tool_names:
+        if "place_order" in tools_used:
+            next_workers = ["FINISH"]
+        elif wants_order and reviewed:
+            next_workers = ["Restaurant_Order_Worker"]
+        elif wants_order and tools_used:
+            next_workers = ["Diet_Recommender_Worker"]
+        elif wants_order:
+            next_workers = ["Health_Profile_Worker", "Restaurant_Order_Worker"]
+        elif tools_used:
+            next_workers = ["FINISH"]
+        elif "menu" in user_text:
+            next_workers = ["Restaurant_Order_Worker"]
+        elif "condition" in user_text:
+            next_workers = ["Health_Profile_Worker"]
+        else:
+            next_workers = ["General_LLM_Worker"]
+        return _tool_call("Router", {"next": next_workers, "chain_of_thought": ["scripted route"]})
+
+    if tool_names and not isinstance(messages[-1], ToolMessage):
+        if "get_menu_compatibility" in tool_names:
+            return _tool_call("get_menu_compatibility", {})
+        if "place_order" in tool_names and reviewed:
+            return _tool_call("place_order", {"order_items": [{"item_id": "SI04", "quantity": 1}], "is_diet_recommended": True})
+        if "search_menu" in tool_names and wants_order:
+            return _tool_call("search_menu", {"query": "dosa", "tags": ["diabetes"]})
+        if "get_menu" in tool_names:
+            return _tool_call("get_menu", {})
+        if "get_dietary_restrictions" in tool_names and wants_order:
+            return _tool_call("get_dietary_restrictions", {})
+        if "get_current_conditions" in tool_names:
+            return _tool_call("get_current_conditions", {})
+    return AIMessage(content=f"Here is what I found: {str(messages[-1].content)[:80]}")
+
+
+class ScriptedChatModel(BaseChatModel):
+    """
+    Offline fake chat model. Replies come from `responder(messages, bound_tool_names)`,
+    each call sleeps for `latency_seconds` and reports approximate prompt/completion
+    token usage, so graphs can be benchmarked without calling the provider.
+    """
+
+    responder: Callable[[List[BaseMessage], List[str]], AIMessage] = scripted_reply
+    latency_seconds: float = 0.0
+    completion_tokens: Optional[int] = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted-fake"
+
+    def bind_tools(self, tools, *, tool_choice: Optional[Any] = None, **kwargs):
+        return self.bind(tools=[convert_to_openai_tool(tool) for tool in tools], tool_choice=tool_choice, **kwargs)
+
+    def _reply(self, messages: List[BaseMessage], tools: Optional[list]) -> ChatResult:
+        tool_names = [tool["function"]["name"] for tool in tools or []]
+        message = self.responder(messages, tool_names)
+        input_tokens = count_tokens(messages) + sum(count_text_tokens(json.dumps(tool)) for tool in tools or [])
+        output_tokens = self.completion_tokens if self.completion_tokens is not None else count_tokens([message])
+        message.usage_metadata = {
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+        }
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages, stop=None, run_manager=None, tools=None, tool_choice=None, **kwargs) -> ChatResult:
+        time.sleep(self.latency_seconds)
+        return self._reply(messages, tools)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, tools=None, tool_choice=None, **kwargs) -> ChatResult:
+        await asyncio.sleep(self.latency_seconds)
+        return self._reply(messages, tools)
@@ -0,0 +1,157 @@
+"""
+Offline benchmark of the supervisor graph against a scripted fake chat model.
+
+    cd multi_ai_agent
+    python -m benchmarks.run_benchmarks --iterations 50 --latency-ms 50 --output benchmark_results.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+import uuid
+from langchain_core.callbacks import BaseCallbackHandler
+
+SCENARIOS = {
+    "view_menu": "show me the menu",
+    "check_conditions": "what are my current conditions?",
+    "order_with_review": "please order me something healthy for lunch",
+    # The named item lets the diet rule engine approve the order without the LLM review
+    "order_named_item": "please order 1 Ragi Dosa if it is healthy for me",
+    "fallback_chat": "hello, how are you today?",
+}
+
+
+class TurnUsage(BaseCallbackHandler):
+    """Counts the LLM calls and tokens of one turn, across all nested sub-graphs."""
+
+    run_inline = True
+
+    def __init__(self):
+        self.llm_calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        self.llm_calls += 1
+
+    def on_llm_end(self, response, **kwargs):
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                self.prompt_tokens += usage.get("input_tokens", 0)
+                self.completion_tokens += usage.get("output_tokens", 0)
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))] if ordered else 0.0
+
+
+def summarize(samples, elapsed):
+    return {
+        "turns": len(samples),
+        "errors": sum(1 for sample in samples if sample["error"]),
+        "turns_per_second": len(samples) / elapsed if elapsed else 0.0,
+        "latency_p50_ms": percentile([s["latency"] for s in samples], 50) * 1000,
+        "latency_p95_ms": percentile([s["latency"] for s in samples], 95) * 1000,
+        "llm_calls_per_turn": sum(s["llm_calls"] for s in samples) / len(samples) if samples else 0.0,
+        "prompt_tokens_per_turn": sum(s["prompt_tokens"] for s in samples) / len(samples) if samples else 0.0,
+        "completion_tokens_per_turn": sum(s["completion_tokens"] for s in samples) / len(samples) if samples else 0.0,
+    }
+
+
+async def run_turn(graph, text):
+    usage = TurnUsage()
+    config = {"configurable": {"thread_id": f"bench-{uuid.uuid4().hex}"}, "callbacks": [usage]}
+    started = time.perf_counter()
+    error = None
+    try:
+        await graph.ainvoke({"messages": [("user", text)]}, config)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    return {
+        "latency": time.perf_counter() - started,
+        "llm_calls": usage.llm_calls,
+        "prompt_tokens": usage.prompt_tokens,
+        "completion_tokens": usage.completion_tokens,
+        "error": error,
+    }
+
+
+async def run_scenario(graph, text, iterations, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def bounded():
+        async with semaphore:
+            return await run_turn(graph, text)
+
+    started = time.perf_counter()
+    samples = await asyncio.gather(*[bounded() for _ in range(iterations)])
+    return summarize(samples, time.perf_counter() - started), samples
+
+
+def load_graph(latency_seconds, completion_tokens):
+    # State, orders and the response cache must not leak between runs or into the real stores
+    workdir = tempfile.mkdtemp(prefix="bench-")
+    os.environ["CHECKPOINT_DB_PATH"] = os.path.join(workdir, "checkpoints.sqlite")
+    os.environ["ORDER_DB_PATH"] = os.path.join(workdir, "orders.sqlite")
+    os.environ.setdefault("LLM_CACHE_ENABLED", "false")
+    # Benchmark users have no profiles of their own, the scenarios review orders against the mock one
+    os.environ.setdefault("HEALTH_PROFILE_DEMO_MODE", "true")
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark-offline")
+
+    from utilities.llm_provider import set_llm
+    from benchmarks.fake_chat_model import ScriptedChatModel
+    set_llm(ScriptedChatModel(latency_seconds=latency_seconds, completion_tokens=completion_tokens))
+
+    from agents.diet_supervisor_agent import supervisor_graph_agent
+    logging.getLogger().setLevel(logging.WARNING)
+    return supervisor_graph_agent
+
+
+async def main(args):
+    from utilities.instrumentation import metrics
+
+    graph = load_graph(args.latency_ms / 1000, args.completion_tokens)
+    scenarios = args.scenarios.split(",") if args.scenarios else list(SCENARIOS)
+    results = {}
+    all_samples = []
+    started = time.perf_counter()
+    for name in scenarios:
+        await run_scenario(graph, SCENARIOS[name], args.warmup, args.concurrency)
+        results[name], samples = await run_scenario(graph, SCENARIOS[name], args.iterations, args.concurrency)
+        all_samples.extend(samples)
+        print(f"{name:>20}: {json.dumps(results[name])}")
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "settings": vars(args),
+        "scenarios": results,
+        "overall": summarize(all_samples, time.perf_counter() - started),
+        # ru_maxrss is reported in KB on Linux and in bytes on macOS
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024),
+        # Per-node, per-tool and per-LLM-call breakdown, warmup included
+        "instrumentation": metrics.to_dict(),
+    }
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=2)
+    print(f"overall: {json.dumps(report['overall'])} peak_rss_mb={report['peak_rss_mb']:.1f} -> {args.output}")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline benchmark of the supervisor graph with a scripted fake LLM")
+    parser.add_argument("--iterations", type=int, default=20, help="measured turns per scenario")
+    parser.add_argument("--warmup", type=int, default=2, help="unmeasured turns per scenario")
+    parser.add_argument("--concurrency", type=int, default=1, help="turns run concurrently")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="simulated latency of every LLM call")
+    parser.add_argument("--completion-tokens", type=int, default=None, help="fixed completion tokens per LLM reply")
+    parser.add_argument("--scenarios", default="", help=f"comma separated subset of {','.join(SCENARIOS)}")
+    parser.add_argument("--output", default="benchmark_results.json", help="machine readable JSON report")
+    asyncio.run(main(parser.parse_args()))
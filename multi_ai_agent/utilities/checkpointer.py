@@ -0,0 +1,525 @@
+import asyncio
+import hashlib
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from typing import Any, AsyncIterator, Iterator, Optional, Sequence
+from langchain_core.messages import BaseMessage
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+    writes_sort_key,
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "checkpoints.sqlite")
+
+# Blob type marking a message list stored as references into the messages table
+MESSAGE_REFS_TYPE = "message_refs"
+# A message list version stores only the references appended since its parent version;
+# after this many deltas in a row a full list is stored again, which bounds the chain read on load
+MAX_REF_CHAIN_DEPTH = 32
+# Reads refresh a thread's last_access at most this often, so they keep it from TTL eviction without a write each
+TOUCH_INTERVAL_SECONDS = 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS threads (
+    thread_id TEXT PRIMARY KEY,
+    last_access REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    checkpoint_id TEXT NOT NULL,
+    parent_checkpoint_id TEXT,
+    type TEXT NOT NULL,
+    checkpoint BLOB NOT NULL,
+    metadata_type TEXT NOT NULL,
+    metadata BLOB NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+);
+CREATE TABLE IF NOT EXISTS checkpoint_blobs (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    checkpoint_id TEXT NOT NULL,
+    channel TEXT NOT NULL,
+    version TEXT NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, channel)
+);
+CREATE INDEX IF NOT EXISTS checkpoint_blobs_version ON checkpoint_blobs (thread_id, checkpoint_ns, channel, version);
+CREATE TABLE IF NOT EXISTS blobs (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    channel TEXT NOT NULL,
+    version TEXT NOT NULL,
+    type TEXT NOT NULL,
+    blob BLOB,
+    parent_version TEXT,
+    depth INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (thread_id, checkpoint_ns, channel, version)
+);
+CREATE TABLE IF NOT EXISTS message_refs (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    channel TEXT NOT NULL,
+    version TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    hash TEXT NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, channel, version, seq)
+);
+CREATE INDEX IF NOT EXISTS message_refs_hash ON message_refs (thread_id, hash);
+CREATE TABLE IF NOT EXISTS messages (
+    thread_id TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    type TEXT NOT NULL,
+    blob BLOB NOT NULL,
+    PRIMARY KEY (thread_id, hash)
+);
+CREATE TABLE IF NOT EXISTS writes (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    checkpoint_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    type TEXT NOT NULL,
+    blob BLOB NOT NULL,
+    task_path TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
+"""
+
+
+# Versions of a message list channel, from the given version back to its last full list
+REF_CHAIN_CTE = """
+WITH RECURSIVE chain(version, parent_version) AS (
+    SELECT version, parent_version FROM blobs WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND version = ?
+    UNION ALL
+    SELECT b.version, b.parent_version FROM blobs b JOIN chain c ON b.version = c.parent_version
+    WHERE b.thread_id = ? AND b.checkpoint_ns = ? AND b.channel = ?
+)
+"""
+
+
+def _is_message_list(value: Any) -> bool:
+    return isinstance(value, list) and bool(value) and all(isinstance(message, BaseMessage) for message in value)
+
+
+class SQLiteCheckpointSaver(BaseCheckpointSaver):
+    """
+    Checkpoint saver backed by a single SQLite file in WAL mode, shared by the
+    supervisor graph and all worker sub-graphs.
+
+    Only channels that changed are written per checkpoint, and message lists are
+    stored as references to messages saved once per thread. A new version of a
+    message list only stores the references appended since its parent version, so
+    each super-step only adds its new messages. Sub-graph namespaces are dropped once
+    the parent task that ran them completed successfully, each thread keeps at most
+    `history_limit` checkpoints, threads neither read nor written for longer than
+    `thread_ttl_seconds` are evicted, and orphaned rows are compacted away in a background thread every
+    `compaction_interval_seconds`. The async methods run the SQLite I/O in worker
+    threads, so lock waits never block the event loop.
+    """
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH, thread_ttl_seconds: Optional[float] = 7 * 24 * 3600,
+                 history_limit: Optional[int] = 20, compaction_interval_seconds: float = 300, serde=None):
+        super().__init__(serde=serde)
+        if history_limit is not None and history_limit < 1:
+            raise ValueError("history_limit must be at least 1")
+        self.db_path = db_path
+        self.thread_ttl_seconds = thread_ttl_seconds
+        self.history_limit = history_limit
+        self.compaction_interval_seconds = compaction_interval_seconds
+        self.last_compaction = time.time()
+        self.compaction_thread: Optional[threading.Thread] = None
+        self.touched: dict = {}
+        self.lock = threading.RLock()
+        # The timeout lets several processes (e.g. batch runner shards) share one database
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(blobs)")}
+        if "parent_version" not in columns:
+            # Databases created before message list deltas hold full lists only
+            self.conn.execute("ALTER TABLE blobs ADD COLUMN parent_version TEXT")
+            self.conn.execute("ALTER TABLE blobs ADD COLUMN depth INTEGER NOT NULL DEFAULT 0")
+
+    def _transaction(self):
+        saver = self
+
+        class Transaction:
+            def __enter__(self):
+                saver.lock.acquire()
+                saver.conn.execute("BEGIN IMMEDIATE")
+                return saver.conn
+
+            def __exit__(self, exc_type, exc, tb):
+                try:
+                    saver.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+                finally:
+                    saver.lock.release()
+
+        return Transaction()
+
+    def _dump_value(self, conn, thread_id: str, checkpoint_ns: str, channel: str, version: str, value: Any):
+        if not _is_message_list(value):
+            value_type, blob = self.serde.dumps_typed(value)
+            conn.execute(
+                "INSERT OR REPLACE INTO blobs VALUES (?, ?, ?, ?, ?, ?, NULL, 0)",
+                (thread_id, checkpoint_ns, channel, version, value_type, blob),
+            )
+            return
+        hashes = []
+        for message in value:
+            message_type, blob = self.serde.dumps_typed(message)
+            message_hash = hashlib.sha1(message_type.encode("utf-8") + b"\x00" + blob).hexdigest()
+            conn.execute("INSERT OR IGNORE INTO messages VALUES (?, ?, ?, ?)", (thread_id, message_hash, message_type, blob))
+            hashes.append(message_hash)
+
+        # Only the references appended to the latest stored version, when the list still starts with it
+        parent = conn.execute(
+            "SELECT version, depth FROM blobs WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND type = ? "
+            "AND version < ? ORDER BY version DESC LIMIT 1",
+            (thread_id, checkpoint_ns, channel, MESSAGE_REFS_TYPE, version),
+        ).fetchone()
+        parent_version, depth, start = None, 0, 0
+        if parent is not None and parent[1] < MAX_REF_CHAIN_DEPTH:
+            parent_hashes = self._load_ref_hashes(conn, thread_id, checkpoint_ns, channel, parent[0])
+            if hashes[:len(parent_hashes)] == parent_hashes:
+                parent_version, depth, start = parent[0], parent[1] + 1, len(parent_hashes)
+        conn.execute(
+            "INSERT OR REPLACE INTO blobs VALUES (?, ?, ?, ?, ?, NULL, ?, ?)",
+            (thread_id, checkpoint_ns, channel, version, MESSAGE_REFS_TYPE, parent_version, depth),
+        )
+        conn.execute(
+            "DELETE FROM message_refs WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND version = ?",
+            (thread_id, checkpoint_ns, channel, version),
+        )
+        conn.executemany(
+            "INSERT INTO message_refs VALUES (?, ?, ?, ?, ?, ?)",
+            [(thread_id, checkpoint_ns, channel, version, seq, hashes[seq]) for seq in range(start, len(hashes))],
+        )
+
+    @staticmethod
+    def _chain_params(thread_id: str, checkpoint_ns: str, channel: str, version: str) -> tuple:
+        return (thread_id, checkpoint_ns, channel, version, thread_id, checkpoint_ns, channel)
+
+    def _load_ref_hashes(self, conn, thread_id: str, checkpoint_ns: str, channel: str, version: str) -> list:
+        rows = conn.execute(
+            REF_CHAIN_CTE + "SELECT r.hash FROM chain JOIN message_refs r ON r.thread_id = ? AND r.checkpoint_ns = ? "
+            "AND r.channel = ? AND r.version = chain.version ORDER BY r.seq",
+            self._chain_params(thread_id, checkpoint_ns, channel, version) + (thread_id, checkpoint_ns, channel),
+        ).fetchall()
+        return [message_hash for (message_hash,) in rows]
+
+    def _load_blobs(self, thread_id: str, checkpoint_ns: str, versions: ChannelVersions) -> dict:
+        values = {}
+        for channel, version in versions.items():
+            row = self.conn.execute(
+                "SELECT type, blob FROM blobs WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND version = ?",
+                (thread_id, checkpoint_ns, channel, str(version)),
+            ).fetchone()
+            if row is None or row[0] == "empty":
+                continue
+            if row[0] != MESSAGE_REFS_TYPE:
+                values[channel] = self.serde.loads_typed((row[0], row[1]))
+                continue
+            rows = self.conn.execute(
+                REF_CHAIN_CTE + "SELECT m.type, m.blob FROM chain JOIN message_refs r ON r.thread_id = ? "
+                "AND r.checkpoint_ns = ? AND r.channel = ? AND r.version = chain.version "
+                "JOIN messages m ON m.thread_id = r.thread_id AND m.hash = r.hash ORDER BY r.seq",
+                self._chain_params(thread_id, checkpoint_ns, channel, str(version)) + (thread_id, checkpoint_ns, channel),
+            ).fetchall()
+            values[channel] = [self.serde.loads_typed((message_type, blob)) for message_type, blob in rows]
+        return values
+
+    def _load_writes(self, thread_id: str, checkpoint_ns: str, checkpoint_id: str) -> list:
+        rows = self.conn.execute(
+            "SELECT task_id, idx, channel, type, blob, task_path FROM writes "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+            (thread_id, checkpoint_ns, checkpoint_id),
+        ).fetchall()
+        rows.sort(key=lambda row: writes_sort_key(row[5], row[0], row[1]))
+        return [(task_id, channel, self.serde.loads_typed((value_type, blob))) for task_id, _, channel, value_type, blob, _ in rows]
+
+    def _make_tuple(self, thread_id: str, checkpoint_ns: str, row) -> CheckpointTuple:
+        checkpoint_id, parent_checkpoint_id, checkpoint_type, checkpoint_blob, metadata_type, metadata_blob = row
+        checkpoint = self.serde.loads_typed((checkpoint_type, checkpoint_blob))
+        return CheckpointTuple(
+            config={"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint_id}},
+            checkpoint={
+                **checkpoint,
+                "channel_values": self._load_blobs(thread_id, checkpoint_ns, checkpoint["channel_versions"]),
+            },
+            metadata=self.serde.loads_typed((metadata_type, metadata_blob)),
+            pending_writes=self._load_writes(thread_id, checkpoint_ns, checkpoint_id),
+            parent_config=(
+                {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": parent_checkpoint_id}}
+                if parent_checkpoint_id
+                else None
+            ),
+        )
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        query = ("SELECT checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata FROM checkpoints "
+                 "WHERE thread_id = ? AND checkpoint_ns = ?")
+        self._touch(thread_id)
+        with self.lock:
+            if checkpoint_id := get_checkpoint_id(config):
+                row = self.conn.execute(query + " AND checkpoint_id = ?", (thread_id, checkpoint_ns, checkpoint_id)).fetchone()
+            else:
+                row = self.conn.execute(query + " ORDER BY checkpoint_id DESC LIMIT 1", (thread_id, checkpoint_ns)).fetchone()
+            if row is None:
+                return None
+            checkpoint_tuple = self._make_tuple(thread_id, checkpoint_ns, row)
+        if checkpoint_id:
+            return checkpoint_tuple._replace(config=config)
+        return checkpoint_tuple
+
+    def list(self, config: Optional[RunnableConfig], *, filter: Optional[dict] = None,
+             before: Optional[RunnableConfig] = None, limit: Optional[int] = None) -> Iterator[CheckpointTuple]:
+        query = ("SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata "
+                 "FROM checkpoints WHERE 1 = 1")
+        params = []
+        if config:
+            query += " AND thread_id = ?"
+            params.append(config["configurable"]["thread_id"])
+            self._touch(config["configurable"]["thread_id"])
+            if (checkpoint_ns := config["configurable"].get("checkpoint_ns")) is not None:
+                query += " AND checkpoint_ns = ?"
+                params.append(checkpoint_ns)
+            if checkpoint_id := get_checkpoint_id(config):
+                query += " AND checkpoint_id = ?"
+                params.append(checkpoint_id)
+        if before and (before_checkpoint_id := get_checkpoint_id(before)):
+            query += " AND checkpoint_id < ?"
+            params.append(before_checkpoint_id)
+        query += " ORDER BY checkpoint_id DESC"
+        with self.lock:
+            rows = self.conn.execute(query, params).fetchall()
+        for thread_id, checkpoint_ns, *row in rows:
+            if limit is not None and limit <= 0:
+                break
+            if filter:
+                metadata = self.serde.loads_typed((row[4], row[5]))
+                if not all(metadata.get(key) == value for key, value in filter.items()):
+                    continue
+            if limit is not None:
+                limit -= 1
+            with self.lock:
+                checkpoint_tuple = self._make_tuple(thread_id, checkpoint_ns, row)
+            yield checkpoint_tuple
+
+    def put(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+            new_versions: ChannelVersions) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        parent_checkpoint_id = config["configurable"].get("checkpoint_id")
+        stored = checkpoint.copy()
+        values = stored.pop("channel_values")
+        checkpoint_type, checkpoint_blob = self.serde.dumps_typed(stored)
+        metadata_type, metadata_blob = self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))
+        with self._transaction() as conn:
+            for channel, version in new_versions.items():
+                if channel in values:
+                    self._dump_value(conn, thread_id, checkpoint_ns, channel, str(version), values[channel])
+                else:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO blobs VALUES (?, ?, ?, ?, 'empty', NULL, NULL, 0)",
+                        (thread_id, checkpoint_ns, channel, str(version)),
+                    )
+            conn.execute(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (thread_id, checkpoint_ns, checkpoint["id"], parent_checkpoint_id,
+                 checkpoint_type, checkpoint_blob, metadata_type, metadata_blob),
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO checkpoint_blobs VALUES (?, ?, ?, ?, ?)",
+                [(thread_id, checkpoint_ns, checkpoint["id"], channel, str(version))
+                 for channel, version in checkpoint["channel_versions"].items()],
+            )
+            self.touched[thread_id] = time.time()
+            conn.execute("INSERT OR REPLACE INTO threads VALUES (?, ?)", (thread_id, self.touched[thread_id]))
+            if self.history_limit is not None:
+                self._trim_history(conn, thread_id)
+        self._maybe_schedule_compaction()
+        return {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint["id"]}}
+
+    def put_writes(self, config: RunnableConfig, writes: Sequence[tuple[str, Any]], task_id: str, task_path: str = "") -> None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        with self._transaction() as conn:
+            for index, (channel, value) in enumerate(writes):
+                idx = WRITES_IDX_MAP.get(channel, index)
+                value_type, blob = self.serde.dumps_typed(value)
+                conn.execute(
+                    f"INSERT OR {'IGNORE' if idx >= 0 else 'REPLACE'} INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (thread_id, checkpoint_ns, checkpoint_id, task_id, idx, channel, value_type, blob, task_path),
+                )
+            # Only a successful task is done with the checkpoints of the sub-graphs it ran; after an
+            # error or interrupt (special channels such as __error__) they are what it resumes from
+            if writes and not any(channel in WRITES_IDX_MAP for channel, _ in writes):
+                self._drop_subgraph_namespaces(conn, thread_id, checkpoint_ns, task_id)
+
+    def _touch(self, thread_id: str):
+        """Refreshes the thread's last_access on reads, at most every TOUCH_INTERVAL_SECONDS per thread."""
+        now = time.time()
+        if now - self.touched.get(thread_id, 0) < TOUCH_INTERVAL_SECONDS:
+            return
+        if len(self.touched) > 100_000:
+            self.touched.clear()
+        self.touched[thread_id] = now
+        with self.lock:
+            self.conn.execute("UPDATE threads SET last_access = ? WHERE thread_id = ?", (now, thread_id))
+
+    @staticmethod
+    def _drop_subgraph_namespaces(conn, thread_id: str, checkpoint_ns: str, task_id: str):
+        # Sub-graphs of a task run in "<parent ns>|<node>:<task_id>" and below it
+        prefix = f"{checkpoint_ns}|" if checkpoint_ns else ""
+        patterns = (f"{prefix}*:{task_id}", f"{prefix}*:{task_id}|*")
+        for table in ("checkpoints", "checkpoint_blobs", "writes", "blobs", "message_refs"):
+            conn.execute(
+                f"DELETE FROM {table} WHERE thread_id = ? AND (checkpoint_ns GLOB ? OR checkpoint_ns GLOB ?)",
+                (thread_id, *patterns),
+            )
+
+    def _trim_history(self, conn, thread_id: str):
+        """Keeps the newest `history_limit` checkpoints of the thread, and always the latest one of each namespace."""
+        stale = conn.execute(
+            "SELECT checkpoint_ns, checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_id NOT IN "
+            "(SELECT MAX(checkpoint_id) FROM checkpoints WHERE thread_id = ? GROUP BY checkpoint_ns) "
+            "ORDER BY checkpoint_id DESC LIMIT -1 OFFSET ?",
+            (thread_id, thread_id, self.history_limit),
+        ).fetchall()
+        for table in ("checkpoints", "checkpoint_blobs", "writes"):
+            conn.executemany(
+                f"DELETE FROM {table} WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                [(thread_id, checkpoint_ns, checkpoint_id) for checkpoint_ns, checkpoint_id in stale],
+            )
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._transaction() as conn:
+            for table in ("threads", "checkpoints", "checkpoint_blobs", "blobs", "message_refs", "messages", "writes"):
+                conn.execute(f"DELETE FROM {table} WHERE thread_id = ?", (thread_id,))
+
+    def evict_idle_threads(self) -> int:
+        if self.thread_ttl_seconds is None:
+            return 0
+        with self.lock:
+            idle = self.conn.execute(
+                "SELECT thread_id FROM threads WHERE last_access < ?", (time.time() - self.thread_ttl_seconds,)
+            ).fetchall()
+        for (thread_id,) in idle:
+            self.delete_thread(thread_id)
+        return len(idle)
+
+    def _maybe_schedule_compaction(self):
+        """Starts compaction in a background thread once it is due, so puts never wait for it."""
+        if time.time() - self.last_compaction < self.compaction_interval_seconds:
+            return
+        with self.lock:
+            if self.compaction_thread is not None and self.compaction_thread.is_alive():
+                return
+            self.last_compaction = time.time()
+            self.compaction_thread = threading.Thread(target=self._compact_in_background, name="checkpoint-compaction", daemon=True)
+            self.compaction_thread.start()
+
+    def _compact_in_background(self):
+        try:
+            self.compact()
+        except Exception:
+            logger.exception("checkpoint compaction failed")
+
+    def compact(self) -> dict:
+        """
+        Evicts idle threads, drops blobs, message references and messages no longer
+        reachable from any retained checkpoint (directly or as the parent of a message
+        list delta) and truncates the WAL.
+        """
+        evicted = self.evict_idle_threads()
+        with self._transaction() as conn:
+            # rowcount is not reported for statements starting with WITH
+            changes = conn.total_changes
+            conn.execute(
+                "WITH RECURSIVE live(thread_id, checkpoint_ns, channel, version) AS ("
+                "SELECT thread_id, checkpoint_ns, channel, version FROM checkpoint_blobs "
+                "UNION SELECT b.thread_id, b.checkpoint_ns, b.channel, b.parent_version FROM blobs b JOIN live l "
+                "ON b.thread_id = l.thread_id AND b.checkpoint_ns = l.checkpoint_ns AND b.channel = l.channel "
+                "AND b.version = l.version WHERE b.parent_version IS NOT NULL) "
+                "DELETE FROM blobs WHERE NOT EXISTS (SELECT 1 FROM live l WHERE l.thread_id = blobs.thread_id "
+                "AND l.checkpoint_ns = blobs.checkpoint_ns AND l.channel = blobs.channel AND l.version = blobs.version)"
+            )
+            blobs = conn.total_changes - changes
+            conn.execute(
+                "DELETE FROM message_refs WHERE NOT EXISTS (SELECT 1 FROM blobs b WHERE b.thread_id = message_refs.thread_id "
+                "AND b.checkpoint_ns = message_refs.checkpoint_ns AND b.channel = message_refs.channel "
+                "AND b.version = message_refs.version)"
+            )
+            messages = conn.execute(
+                "DELETE FROM messages WHERE NOT EXISTS (SELECT 1 FROM message_refs r WHERE r.thread_id = messages.thread_id "
+                "AND r.hash = messages.hash)"
+            ).rowcount
+        with self.lock:
+            self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        self.last_compaction = time.time()
+        stats = {"evicted_threads": evicted, "deleted_blobs": blobs, "deleted_messages": messages}
+        logger.info("checkpoint compaction %s", stats)
+        return stats
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config: Optional[RunnableConfig], *, filter: Optional[dict] = None,
+                    before: Optional[RunnableConfig] = None, limit: Optional[int] = None) -> AsyncIterator[CheckpointTuple]:
+        checkpoint_tuples = await asyncio.to_thread(lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+        for checkpoint_tuple in checkpoint_tuples:
+            yield checkpoint_tuple
+
+    async def aput(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+                   new_versions: ChannelVersions) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence[tuple[str, Any]], task_id: str,
+                          task_path: str = "") -> None:
+        return await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        return await asyncio.to_thread(self.delete_thread, thread_id)
+
+    def get_next_version(self, current: Optional[str], channel: None) -> str:
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        return f"{current_v + 1:032}.{random.random():016}"
+
+
+def create_checkpointer() -> SQLiteCheckpointSaver:
+    ttl = float(os.getenv("CHECKPOINT_THREAD_TTL_SECONDS", str(7 * 24 * 3600)))
+    history_limit = int(os.getenv("CHECKPOINT_HISTORY_LIMIT", "20"))
+    return SQLiteCheckpointSaver(
+        db_path=os.getenv("CHECKPOINT_DB_PATH", DEFAULT_DB_PATH),
+        thread_ttl_seconds=ttl if ttl > 0 else None,
+        history_limit=history_limit if history_limit > 0 else None,
+        compaction_interval_seconds=float(os.getenv("CHECKPOINT_COMPACTION_INTERVAL_SECONDS", "300")),
+    )
+
+# Shared by the supervisor graph and every worker sub-graph
+checkpointer = create_checkpointer()
@@ -0,0 +1,122 @@
+import json
+import logging
+import os
+from functools import lru_cache
+from typing import Dict, List, Optional
+from langchain_core.messages import BaseMessage, HumanMessage, ToolMessage
+
+logger = logging.getLogger(__name__)
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("o200k_base")
+except Exception:  # tiktoken missing or encoding files unavailable offline
+    _encoding = None
+
+# Rough per-message overhead of the chat format (role, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+@lru_cache(maxsize=8192)
+def count_text_tokens(text: str) -> int:
+    if _encoding is None:
+        return len(text) // 4 + 1
+    return len(_encoding.encode(text, disallowed_special=()))
+
+
+def _content_text(message: BaseMessage) -> str:
+    return message.content if isinstance(message.content, str) else json.dumps(message.content)
+
+
+def count_message_tokens(message: BaseMessage) -> int:
+    tokens = MESSAGE_OVERHEAD_TOKENS + count_text_tokens(_content_text(message))
+    for tool_call in getattr(message, "tool_calls", None) or []:
+        tokens += count_text_tokens(tool_call["name"] + json.dumps(tool_call["args"]))
+    return tokens
+
+
+def count_tokens(messages: List[BaseMessage]) -> int:
+    return sum(count_message_tokens(message) for message in messages)
+
+
+class ContextManager:
+    """
+    Context stage every agent node passes its message history through before calling
+    the LLM. The last `keep_last_turns` turns are kept verbatim, older tool results are
+    shrunk to compact summaries and, when the node budget is still exceeded, the oldest
+    turns are dropped whole so tool calls and their results stay paired.
+    """
+
+    def __init__(self, default_budget: int = 6000, node_budgets: Optional[Dict[str, int]] = None,
+                 keep_last_turns: int = 3, tool_summary_chars: int = 200):
+        if keep_last_turns < 1:
+            raise ValueError("keep_last_turns must be at least 1")
+        self.default_budget = default_budget
+        self.node_budgets = node_budgets or {}
+        self.keep_last_turns = keep_last_turns
+        self.tool_summary_chars = tool_summary_chars
+        self.metrics: Dict[str, Dict[str, int]] = {}
+
+    def budget_for(self, node: str) -> int:
+        return self.node_budgets.get(node, self.default_budget)
+
+    def summarize_tool_result(self, message: ToolMessage) -> ToolMessage:
+        content = _content_text(message)
+        if len(content) <= self.tool_summary_chars:
+            return message
+        try:
+            status = json.loads(content).get("status")
+        except (ValueError, AttributeError):
+            status = None
+        summary = (
+            f"[compacted {message.name or 'tool'} result, status={status}, {len(content)} chars; "
+            f"call the tool again for full data] {content[:self.tool_summary_chars]}..."
+        )
+        return message.model_copy(update={"content": summary})
+
+    def prepare(self, node: str, messages: List[BaseMessage]) -> List[BaseMessage]:
+        turn_starts = [index for index, message in enumerate(messages) if isinstance(message, HumanMessage)]
+        recent_start = turn_starts[-self.keep_last_turns] if len(turn_starts) >= self.keep_last_turns else 0
+        prepared = [
+            self.summarize_tool_result(message) if index < recent_start and isinstance(message, ToolMessage) else message
+            for index, message in enumerate(messages)
+        ]
+
+        budget = self.budget_for(node)
+        tokens = [count_message_tokens(message) for message in prepared]
+        total = sum(tokens)
+        start = 0
+        later_turns = [index for index in turn_starts if index > 0]
+        while total > budget and later_turns:
+            next_start = later_turns.pop(0)
+            total -= sum(tokens[start:next_start])
+            start = next_start
+        prepared = prepared[start:]
+
+        tokens_in = count_tokens(messages)
+        node_metrics = self.metrics.setdefault(node, {"calls": 0, "tokens_in": 0, "tokens_out": 0, "tokens_saved": 0})
+        node_metrics["calls"] += 1
+        node_metrics["tokens_in"] += tokens_in
+        node_metrics["tokens_out"] += total
+        node_metrics["tokens_saved"] += tokens_in - total
+        if total > budget:
+            logger.warning("%s context of %d tokens exceeds its budget of %d", node, total, budget)
+        return prepared
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {node: dict(node_metrics) for node, node_metrics in self.metrics.items()}
+
+
+def _parse_node_budgets(value: str) -> Dict[str, int]:
+    budgets = {}
+    for entry in filter(None, (part.strip() for part in value.split(","))):
+        node, _, budget = entry.partition("=")
+        budgets[node.strip()] = int(budget)
+    return budgets
+
+
+context_manager = ContextManager(
+    default_budget=int(os.getenv("CONTEXT_TOKEN_BUDGET", "6000")),
+    node_budgets=_parse_node_budgets(os.getenv("CONTEXT_NODE_BUDGETS", "")),
+    keep_last_turns=int(os.getenv("CONTEXT_KEEP_LAST_TURNS", "3")),
+)
@@ -0,0 +1,126 @@
+import re
+from typing import List
+import numpy as np
+from utilities.menu_catalog import CompiledMenu
+
+# Restriction categories and the item name/description keywords that put an item in them.
+CATEGORY_PATTERNS = {
+    "high_gi": r"\b(rice|maida|parotta|potato|halwa|payasam|jaggery|sugar)\b",
+    "sugar": r"\b(sugar|jaggery|halwa|payasam|dessert|sweet)\b",
+    "white_rice": r"\brice\b",
+    "maida": r"\b(maida|parotta|refined flour)\b",
+    "fried": r"\b(fried|fritters?|vada|vadai|bonda|bajji|pakora)\b",
+    "high_sodium": r"\b(pickles?|papad|salted|chips)\b",
+    "pickled": r"\bpickles?\b",
+    "processed": r"\b(processed|instant|packaged)\b",
+    "soy": r"\b(soy|soya|tofu)\b",
+    "raw_cruciferous": r"\b(cabbage|cauliflower|broccoli|kale)\b",
+    "caffeine": r"\b(coffee|tea|caffeine|chocolate)\b",
+    "dairy": r"\b(yogurt|curd|milk|paneer|ghee|cream|butter|payasam|halwa)\b",
+    "spicy": r"\b(spicy|spiced|pepper|chilli|chili|masala)\b",
+    "citrus": r"\b(lemon|lime|orange|citrus)\b",
+}
+
+# Keywords of the free text health profile restrictions and the categories they map to.
+RESTRICTION_KEYWORDS = {
+    "high-gi": ["high_gi"],
+    "sugar": ["sugar"],
+    "white rice": ["white_rice"],
+    "maida": ["maida"],
+    "sodium": ["high_sodium"],
+    "fried": ["fried"],
+    "pickle": ["pickled", "high_sodium"],
+    "processed": ["processed"],
+    "soy": ["soy"],
+    "cruciferous": ["raw_cruciferous"],
+    "caffeine": ["caffeine"],
+    "dairy": ["dairy"],
+    "spicy": ["spicy"],
+    "citrus": ["citrus"],
+}
+
+# Keywords of health condition names and the menu health tags that vouch for an item
+# being suitable for them. Conditions without an entry have no positively tagged items.
+CONDITION_COMPATIBLE_TAGS = {
+    "diabet": ["diabetes", "millet", "high-fiber"],
+    "hypertension": ["heart-health"],
+    "heart": ["heart-health"],
+    "cholesterol": ["heart-health", "high-fiber"],
+    "anemia": ["anemia"],
+    "iron deficiency": ["anemia"],
+    "obesity": ["weight-loss"],
+    "overweight": ["weight-loss"],
+    "digest": ["digestion"],
+    "ibs": ["digestion", "high-fiber"],
+}
+
+
+class DietCompatibilityMatrix:
+    """
+    Precomputed rows x restriction-categories boolean matrix over a compiled menu. A
+    user's restrictions become a category mask, so the whole menu is scored in one
+    vectorized operation; item dicts are only built for the rows a result returns.
+    """
+
+    def __init__(self, menu: CompiledMenu):
+        self.menu = menu
+        self.categories = list(CATEGORY_PATTERNS)
+        self.category_positions = {category: position for position, category in enumerate(self.categories)}
+        texts = [f"{name} {description}" for name, description in
+                 zip(menu.column_strings("name"), menu.column_strings("description"))]
+        self.matrix = np.zeros((len(menu), len(self.categories)), dtype=bool)
+        for position, category in enumerate(self.categories):
+            pattern = re.compile(CATEGORY_PATTERNS[category], re.IGNORECASE)
+            self.matrix[:, position] = [bool(pattern.search(text)) for text in texts]
+
+    def restriction_mask(self, restrictions: List[str]):
+        """
+        Returns the category mask for the restrictions and the restrictions that
+        could not be mapped to any category.
+        """
+        mask = np.zeros(len(self.categories), dtype=bool)
+        unmapped = []
+        for restriction in restrictions:
+            text = restriction.lower()
+            categories = [c for keyword, mapped in RESTRICTION_KEYWORDS.items() if keyword in text for c in mapped]
+            if not categories:
+                unmapped.append(restriction)
+            for category in categories:
+                mask[self.category_positions[category]] = True
+        return mask, unmapped
+
+    @staticmethod
+    def compatible_tags(conditions: List[str]) -> set:
+        """Health tags marking an item as suitable for at least one of the conditions."""
+        return {tag for condition in conditions for keyword, tags in CONDITION_COMPATIBLE_TAGS.items()
+                if keyword in condition.lower() for tag in tags}
+
+    def score(self, mask) -> np.ndarray:
+        return (self.matrix & mask).any(axis=1)
+
+    def safe_rows(self, current_restrictions: List[str], past_restrictions: List[str]) -> np.ndarray:
+        """Rows hitting neither current nor past restrictions."""
+        avoid_mask, _ = self.restriction_mask(current_restrictions)
+        caution_mask, _ = self.restriction_mask(past_restrictions)
+        return np.flatnonzero(~(self.score(avoid_mask) | self.score(caution_mask)))
+
+    def _describe(self, row: int, mask) -> dict:
+        reasons = [self.categories[position] for position in np.flatnonzero(self.matrix[row] & mask)]
+        return {**self.menu.brief(row), "reasons": reasons}
+
+    def classify(self, current_restrictions: List[str], past_restrictions: List[str]) -> dict:
+        """
+        Items hitting a current restriction are avoid, items hitting only a past
+        restriction are caution and everything else is safe.
+        """
+        avoid_mask, unmapped_current = self.restriction_mask(current_restrictions)
+        caution_mask, unmapped_past = self.restriction_mask(past_restrictions)
+        avoid = self.score(avoid_mask)
+        caution = self.score(caution_mask) & ~avoid
+        safe = ~(avoid | caution)
+        return {
+            "safe": [self.menu.brief(row) for row in np.flatnonzero(safe)],
+            "caution": [self._describe(row, caution_mask) for row in np.flatnonzero(caution)],
+            "avoid": [self._describe(row, avoid_mask) for row in np.flatnonzero(avoid)],
+            "unmapped_restrictions": sorted(set(unmapped_current + unmapped_past)),
+        }
@@ -0,0 +1,139 @@
+import re
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+import numpy as np
+from utilities.diet_compatibility import DietCompatibilityMatrix
+
+ITEM_ID_PATTERN = r"\b[A-Z]{2}\d{2}\b"
+# An order request up to the end of its sentence, e.g. "order 2 Ragi Dosa and 1 Avial"
+ORDER_CLAUSE_PATTERN = re.compile(r"\b(?:order|buy|get me|i(?:'ll| will) have)\b([^.?!]*)", re.IGNORECASE)
+
+
+class OrderVerdict(NamedTuple):
+    decision: str  # "approve", "reject" or "escalate"
+    items: List[dict]
+    unmapped_restrictions: List[str]
+    reason: str
+
+
+class DietRuleEngine:
+    """
+    Deterministic order review on top of the compatibility matrix. An order hitting a
+    current restriction is rejected. An order is only approved when it hits no
+    restriction and every item carries a health tag compatible with one of the user's
+    current conditions (e.g. a millet dosa for diabetes); not matching a restriction
+    keyword alone proves nothing. Everything else (untagged items, past restrictions,
+    unknown items or restrictions that cannot be screened) is escalated to the diet
+    recommender LLM.
+    """
+
+    def __init__(self, matrix: DietCompatibilityMatrix):
+        self.matrix = matrix
+        self.menu = matrix.menu
+        ids, names = self.menu.column_strings("id"), self.menu.column_strings("name")
+        self.ids_by_name = {name.lower(): item_id for item_id, name in zip(ids, names)}
+        names = sorted(names, key=len, reverse=True)
+        self.item_pattern = re.compile(
+            r"(?:\b(\d+)\s*(?:x\s*)?)?(" + "|".join(re.escape(name) for name in names) + "|" + ITEM_ID_PATTERN + r")\b",
+            re.IGNORECASE,
+        )
+
+    def extract_ordered_items(self, text: str) -> List[dict]:
+        """
+        Items the user explicitly orders: a quantity and an item inside an order clause.
+        Items only mentioned, e.g. compared in a question, are not part of the order.
+        """
+        order_items = {}
+        for clause in ORDER_CLAUSE_PATTERN.finditer(text):
+            for match in self.item_pattern.finditer(clause.group(1)):
+                if match.group(1):
+                    mention = match.group(2)
+                    item_id = self.ids_by_name.get(mention.lower(), mention.upper())
+                    order_items[item_id] = {"item_id": item_id, "quantity": int(match.group(1))}
+        return list(order_items.values())
+
+    def evaluate(self, order_items: List[dict], restrictions: dict) -> OrderVerdict:
+        return self.evaluate_batch([(None, order_items)], lambda user_id: restrictions)[0]
+
+    def evaluate_batch(self, orders: Iterable[Tuple[Optional[str], List[dict]]],
+                       restrictions_for: Callable[[Optional[str]], dict]) -> List[OrderVerdict]:
+        """
+        Evaluates many (user_id, order_items) pairs in one pass. Restriction masks are
+        built once per user and all ordered items are scored in a single matrix operation.
+        """
+        orders = list(orders)
+        user_positions: Dict[Optional[str], int] = {}
+        avoid_masks, caution_masks, unmapped, compatible_tags = [], [], [], []
+        rows, row_users, row_orders, quantities = [], [], [], []
+        unknown = [[] for _ in orders]
+        for order_position, (user_id, order_items) in enumerate(orders):
+            if user_id not in user_positions:
+                restrictions = restrictions_for(user_id)
+                avoid_mask, unmapped_current = self.matrix.restriction_mask(restrictions["current_restrictions"])
+                caution_mask, unmapped_past = self.matrix.restriction_mask(restrictions["past_restrictions"])
+                user_positions[user_id] = len(avoid_masks)
+                avoid_masks.append(avoid_mask)
+                caution_masks.append(caution_mask)
+                unmapped.append(sorted(set(unmapped_current + unmapped_past)))
+                compatible_tags.append(self.matrix.compatible_tags(restrictions.get("current_conditions", [])))
+            for order_item in order_items:
+                row = self.menu.row_of(order_item.get("item_id"))
+                if row is None:
+                    unknown[order_position].append(order_item.get("item_id"))
+                    continue
+                rows.append(row)
+                row_users.append(user_positions[user_id])
+                row_orders.append(order_position)
+                quantities.append(order_item.get("quantity", 1))
+
+        categories = np.array(self.matrix.categories)
+        item_matrix = self.matrix.matrix[rows]
+        avoid_hits = item_matrix & np.array(avoid_masks)[row_users] if rows else item_matrix
+        caution_hits = item_matrix & np.array(caution_masks)[row_users] if rows else item_matrix
+        avoid = avoid_hits.any(axis=1)
+        caution = caution_hits.any(axis=1) & ~avoid
+
+        reviewed_items = [[] for _ in orders]
+        for position, row in enumerate(rows):
+            item = self.menu.brief(row)
+            status = "avoid" if avoid[position] else "caution" if caution[position] else "safe"
+            hits = avoid_hits[position] if status == "avoid" else caution_hits[position]
+            reviewed_items[row_orders[position]].append({
+                "id": item["id"], "name": item["name"], "quantity": quantities[position],
+                "status": status, "reasons": categories[hits].tolist(),
+                "compatible_tags": sorted(set(self.menu.row_tags(row)) & compatible_tags[row_users[position]]),
+            })
+
+        verdicts = []
+        for order_position, (user_id, order_items) in enumerate(orders):
+            items = reviewed_items[order_position]
+            user_unmapped = unmapped[user_positions[user_id]]
+            statuses = {item["status"] for item in items}
+            if not order_items:
+                verdict = ("escalate", "no menu items found in the order")
+            elif "avoid" in statuses:
+                verdict = ("reject", "items conflict with current health conditions")
+            elif unknown[order_position]:
+                verdict = ("escalate", f"items not on the menu: {unknown[order_position]}")
+            elif user_unmapped:
+                verdict = ("escalate", "some restrictions cannot be screened automatically")
+            elif "caution" in statuses:
+                verdict = ("escalate", "items touch restrictions of past conditions")
+            elif not all(item["compatible_tags"] for item in items):
+                verdict = ("escalate", "items are not tagged as suitable for the user's conditions")
+            else:
+                verdict = ("approve", "every item is tagged as suitable for the user's conditions and hits no restriction")
+            verdicts.append(OrderVerdict(verdict[0], items, user_unmapped, verdict[1]))
+        return verdicts
+
+    def alternatives(self, restrictions: dict, limit: int = 3) -> List[dict]:
+        """
+        Menu items `evaluate` would approve, to suggest instead of a rejected order: no
+        restriction hits and a health tag compatible with a current condition. None
+        when some restriction cannot be screened, as every order is escalated then.
+        """
+        current, past = restrictions["current_restrictions"], restrictions["past_restrictions"]
+        if self.matrix.restriction_mask(current)[1] or self.matrix.restriction_mask(past)[1]:
+            return []
+        compatible_tags = self.matrix.compatible_tags(restrictions.get("current_conditions", []))
+        rows = [row for row in self.matrix.safe_rows(current, past) if compatible_tags & set(self.menu.row_tags(row))]
+        return [self.menu.brief(row) for row in rows[:limit]]
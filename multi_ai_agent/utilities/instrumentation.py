@@ -0,0 +1,347 @@
+import asyncio
+import cProfile
+import json
+import logging
+import os
+import random
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional, Tuple
+from langchain_core.callbacks import BaseCallbackHandler
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+TOKEN_BUCKETS = (50, 100, 250, 500, 1000, 2500, 5000, 10000, 25000)
+HOP_BUCKETS = (1, 2, 3, 4, 5, 6, 8, 10, 15, 20)
+
+
+def _label_key(labels: Optional[dict]) -> Tuple:
+    return tuple(sorted((labels or {}).items()))
+
+
+def _escape_label_value(value) -> str:
+    # Backslash, double quote and line feed must be escaped in the Prometheus text format
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key: Tuple, extra: str = "") -> str:
+    parts = [f'{name}="{_escape_label_value(value)}"' for name, value in key]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def to_dict(self) -> dict:
+        return {"count": self.count, "sum": self.sum, "buckets": dict(zip([*map(str, self.buckets), "+Inf"], self.counts))}
+
+
+class MetricsRegistry:
+    """
+    Process wide counters and histograms with Prometheus text and JSON exports.
+    Collectors registered with `register_collector` add component stats (cache,
+    context manager, streaming, ...) to the JSON dump.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters: Dict[str, Dict[Tuple, float]] = {}
+        self.gauges: Dict[str, Dict[Tuple, float]] = {}
+        self.histograms: Dict[str, Dict[Tuple, Histogram]] = {}
+        self.histogram_buckets: Dict[str, tuple] = {}
+        self.descriptions: Dict[str, str] = {}
+        self.collectors: Dict[str, Callable[[], dict]] = {}
+
+    def describe(self, name: str, description: str, buckets: Optional[tuple] = None):
+        self.descriptions[name] = description
+        if buckets is not None:
+            self.histogram_buckets[name] = buckets
+
+    def inc(self, name: str, labels: Optional[dict] = None, value: float = 1):
+        with self.lock:
+            series = self.counters.setdefault(name, {})
+            key = _label_key(labels)
+            series[key] = series.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, labels: Optional[dict] = None):
+        with self.lock:
+            self.gauges.setdefault(name, {})[_label_key(labels)] = value
+
+    def observe(self, name: str, value: float, labels: Optional[dict] = None):
+        with self.lock:
+            series = self.histograms.setdefault(name, {})
+            key = _label_key(labels)
+            if key not in series:
+                series[key] = Histogram(self.histogram_buckets.get(name, LATENCY_BUCKETS))
+            series[key].observe(value)
+
+    def register_collector(self, name: str, collector: Callable[[], dict]):
+        self.collectors[name] = collector
+
+    def to_prometheus(self) -> str:
+        lines = []
+        with self.lock:
+            for name, series in sorted(self.counters.items()):
+                lines.append(f"# HELP {name} {self.descriptions.get(name, name)}")
+                lines.append(f"# TYPE {name} counter")
+                lines.extend(f"{name}{_format_labels(key)} {value}" for key, value in series.items())
+            for name, series in sorted(self.gauges.items()):
+                lines.append(f"# HELP {name} {self.descriptions.get(name, name)}")
+                lines.append(f"# TYPE {name} gauge")
+                lines.extend(f"{name}{_format_labels(key)} {value}" for key, value in series.items())
+            for name, series in sorted(self.histograms.items()):
+                lines.append(f"# HELP {name} {self.descriptions.get(name, name)}")
+                lines.append(f"# TYPE {name} histogram")
+                for key, histogram in series.items():
+                    cumulative = 0
+                    for bound, count in zip([*map(str, histogram.buckets), "+Inf"], histogram.counts):
+                        cumulative += count
+                        bucket_labels = _format_labels(key, 'le="%s"' % bound)
+                        lines.append(f"{name}_bucket{bucket_labels} {cumulative}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {histogram.sum}")
+                    lines.append(f"{name}_count{_format_labels(key)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def to_dict(self) -> dict:
+        with self.lock:
+            data = {
+                "counters": {name: [{"labels": dict(key), "value": value} for key, value in series.items()]
+                             for name, series in self.counters.items()},
+                "gauges": {name: [{"labels": dict(key), "value": value} for key, value in series.items()]
+                           for name, series in self.gauges.items()},
+                "histograms": {name: [{"labels": dict(key), **histogram.to_dict()} for key, histogram in series.items()]
+                               for name, series in self.histograms.items()},
+            }
+        data["components"] = {}
+        for name, collector in self.collectors.items():
+            try:
+                data["components"][name] = collector()
+            except Exception as e:
+                data["components"][name] = {"error": str(e)}
+        return data
+
+    def dump_json(self, path: str):
+        with open(path, "w") as file:
+            json.dump(self.to_dict(), file, indent=2, default=str)
+
+
+metrics = MetricsRegistry()
+metrics.describe("node_duration_seconds", "Wall time of graph nodes, labelled by graph and node")
+metrics.describe("node_errors_total", "Graph node runs that raised")
+metrics.describe("tool_duration_seconds", "Wall time of tool executions")
+metrics.describe("tool_errors_total", "Tool executions that raised")
+metrics.describe("llm_duration_seconds", "Wall time of LLM calls, labelled by the calling node")
+metrics.describe("llm_prompt_tokens", "Prompt tokens per LLM call", TOKEN_BUCKETS)
+metrics.describe("llm_completion_tokens", "Completion tokens per LLM call", TOKEN_BUCKETS)
+metrics.describe("llm_retries_total", "LLM and tool retries")
+metrics.describe("routing_decisions_total", "Supervisor routing decisions by target and source (rule or llm)")
+metrics.describe("turn_hops", "Supervisor hops per user turn", HOP_BUCKETS)
+metrics.describe("turn_duration_seconds", "Wall time of a user turn through the supervisor graph")
+metrics.describe("turn_budget_exhausted_total", "Turns ended by the finalizer, by exhausted budget (hops, tokens, time, repeated_route)")
+
+
+def _graph_label(metadata: dict) -> str:
+    """Name of the worker a nested node runs in, or `supervisor_graph` for top level nodes."""
+    checkpoint_ns = (metadata or {}).get("langgraph_checkpoint_ns", "")
+    parents = checkpoint_ns.split("|")[:-1]
+    return parents[-1].split(":")[0] if parents else "supervisor_graph"
+
+
+class InstrumentationCallbackHandler(BaseCallbackHandler):
+    """
+    Records wall time of every graph node (in the supervisor graph and all worker
+    sub-graphs, including ToolNodes), every tool and every LLM call together with
+    its prompt/completion tokens and retries. Attached once to the supervisor graph,
+    it is inherited by the nested sub-graph runs.
+    """
+
+    # Cheap bookkeeping: run on the event loop instead of a hop through the default executor
+    run_inline = True
+
+    def __init__(self, registry: MetricsRegistry = metrics):
+        self.registry = registry
+        self.runs: Dict[object, Tuple[str, dict, float]] = {}
+
+    def on_chain_start(self, serialized, inputs, *, run_id, metadata=None, name=None, **kwargs):
+        if metadata and name and metadata.get("langgraph_node") == name:
+            self.runs[run_id] = ("node", {"graph": _graph_label(metadata), "node": name}, time.perf_counter())
+
+    def _finish(self, run_id, error: bool = False):
+        entry = self.runs.pop(run_id, None)
+        if entry is None:
+            return None
+        kind, labels, started = entry
+        self.registry.observe(f"{kind}_duration_seconds", time.perf_counter() - started, labels)
+        if error:
+            self.registry.inc(f"{kind}_errors_total", labels)
+        return labels
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._finish(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id, error=True)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, metadata=None, name=None, **kwargs):
+        tool = name or (serialized or {}).get("name", "unknown")
+        self.runs[run_id] = ("tool", {"tool": tool}, time.perf_counter())
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self._finish(run_id)
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id, error=True)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+        labels = {"graph": _graph_label(metadata), "node": (metadata or {}).get("langgraph_node", "unknown")}
+        self.runs[run_id] = ("llm", labels, time.perf_counter())
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        labels = self._finish(run_id)
+        if labels is None:
+            return
+        prompt_tokens = completion_tokens = 0
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                prompt_tokens += usage.get("input_tokens", 0)
+                completion_tokens += usage.get("output_tokens", 0)
+        if not prompt_tokens and response.llm_output:
+            token_usage = response.llm_output.get("token_usage") or {}
+            prompt_tokens = token_usage.get("prompt_tokens", 0)
+            completion_tokens = token_usage.get("completion_tokens", 0)
+        self.registry.observe("llm_prompt_tokens", prompt_tokens, labels)
+        self.registry.observe("llm_completion_tokens", completion_tokens, labels)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id, error=True)
+
+    def on_retry(self, retry_state, *, run_id, **kwargs):
+        self.registry.inc("llm_retries_total")
+
+
+class TurnProfiler:
+    """
+    Samples a fraction of turns with cProfile and keeps the profile of the sampled
+    turns slower than `slow_turn_seconds`. cProfile is process wide, so at most one
+    turn is profiled at a time. A watchdog on the event loop disables a profile still
+    running after `max_seconds`, e.g. of a turn that ended without reaching `stop()`.
+    """
+
+    def __init__(self, sample_rate: float = 0.0, slow_turn_seconds: float = 5.0, output_dir: str = "profiles",
+                 max_seconds: float = 300.0):
+        self.sample_rate = sample_rate
+        self.slow_turn_seconds = slow_turn_seconds
+        self.output_dir = output_dir
+        self.max_seconds = max_seconds
+        self.active: Optional[Tuple[str, cProfile.Profile]] = None
+        self.watchdog: Optional[asyncio.TimerHandle] = None
+        self.lock = threading.Lock()
+
+    def start(self, turn_id: str):
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            return
+        with self.lock:
+            if self.active is not None:
+                return
+            profile = cProfile.Profile()
+            self.active = (turn_id, profile)
+            try:
+                # Runs on the loop thread, which is the thread the profile is enabled on
+                self.watchdog = asyncio.get_running_loop().call_later(self.max_seconds, self._expire, profile)
+            except RuntimeError:
+                self.watchdog = None
+        profile.enable()
+
+    def _expire(self, profile: cProfile.Profile):
+        with self.lock:
+            if self.active is None or self.active[1] is not profile:
+                return
+            turn_id = self.active[0]
+            self.active = None
+            self.watchdog = None
+        profile.disable()
+        logger.warning("profile of turn %s still running after %.0fs, discarded", turn_id, self.max_seconds)
+
+    def stop(self, turn_id: str, duration: float) -> Optional[str]:
+        with self.lock:
+            if self.active is None or self.active[0] != turn_id:
+                return None
+            profile = self.active[1]
+            self.active = None
+            if self.watchdog is not None:
+                self.watchdog.cancel()
+                self.watchdog = None
+        profile.disable()
+        if duration < self.slow_turn_seconds:
+            return None
+        os.makedirs(self.output_dir, exist_ok=True)
+        path = os.path.join(self.output_dir, f"turn-{int(time.time() * 1000)}-{turn_id}.prof")
+        profile.dump_stats(path)
+        logger.warning("slow turn %s took %.2fs, profile written to %s", turn_id, duration, path)
+        return path
+
+
+turn_profiler = TurnProfiler(
+    sample_rate=float(os.getenv("PROFILE_SAMPLE_RATE", "0")),
+    slow_turn_seconds=float(os.getenv("PROFILE_SLOW_TURN_SECONDS", "5")),
+    output_dir=os.getenv("PROFILE_OUTPUT_DIR", "profiles"),
+    max_seconds=float(os.getenv("PROFILE_MAX_SECONDS", "300")),
+)
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/metrics":
+            body, content_type = metrics.to_prometheus(), "text/plain; version=0.0.4"
+        elif self.path == "/metrics.json":
+            body, content_type = json.dumps(metrics.to_dict(), default=str), "application/json"
+        else:
+            self.send_error(404)
+            return
+        payload = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+
+_metrics_server = None
+
+
+def start_metrics_server(port: int, host: str = "127.0.0.1"):
+    """Serves /metrics (Prometheus text) and /metrics.json from a daemon thread."""
+    global _metrics_server
+    if _metrics_server is not None:
+        return _metrics_server
+    try:
+        _metrics_server = ThreadingHTTPServer((host, port), MetricsRequestHandler)
+    except OSError as e:
+        logger.warning("metrics server not started on port %s: %s", port, e)
+        return None
+    threading.Thread(target=_metrics_server.serve_forever, name="metrics-server", daemon=True).start()
+    logger.info("metrics server listening on %s:%s", host, port)
+    return _metrics_server
+
+
+def maybe_start_metrics_server():
+    if port := os.getenv("METRICS_PORT"):
+        start_metrics_server(int(port), os.getenv("METRICS_HOST", "127.0.0.1"))
@@ -0,0 +1,185 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Optional
+from langchain_core.caches import BaseCache, RETURN_VAL_TYPE
+from langchain_core.load import dumps, loads
+from langchain_core.messages import AIMessage
+from langchain_core.utils.utils import LC_ID_PREFIX
+
+# Fields that differ between otherwise identical requests (run ids, tool call ids,
+# provider metadata) and would otherwise defeat the cache.
+VOLATILE_MESSAGE_FIELDS = {"id", "tool_call_id", "response_metadata", "usage_metadata", "additional_kwargs"}
+
+
+def _strip_volatile(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {k: _strip_volatile(v) for k, v in value.items() if k not in VOLATILE_MESSAGE_FIELDS}
+    if isinstance(value, list):
+        return [_strip_volatile(v) for v in value]
+    if isinstance(value, str):
+        return " ".join(value.split())
+    return value
+
+
+def normalize_prompt(prompt: str) -> str:
+    """
+    Normalizes the serialized message list so that requests differing only in
+    message/tool-call ids, provider metadata or whitespace share a cache entry.
+    """
+    try:
+        messages = json.loads(prompt)
+    except ValueError:
+        return " ".join(prompt.split())
+    if isinstance(messages, list):
+        messages = [
+            {**message, "kwargs": _strip_volatile(message.get("kwargs", {}))} if isinstance(message, dict) else message
+            for message in messages
+        ]
+    return json.dumps(messages, sort_keys=True, separators=(",", ":"))
+
+
+def _as_cache_hit(generation: Any) -> Any:
+    """
+    Copy of a cached generation whose message gets a fresh id (the id of the cached
+    message would collide with the original in the graph state, and chat models do not
+    assign ids to cache hits) and zero token usage, so hits are not counted against
+    turn token budgets.
+    """
+    message = getattr(generation, "message", None)
+    if not isinstance(message, AIMessage):
+        return generation
+    return generation.model_copy(update={"message": message.model_copy(update={
+        "id": f"{LC_ID_PREFIX}-cache-{uuid.uuid4()}",
+        "usage_metadata": {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0},
+        "response_metadata": {**message.response_metadata, "cache_hit": True},
+    })})
+
+
+def make_cache_key(prompt: str, llm_string: str) -> str:
+    """
+    The llm_string already carries the model parameters together with the bound
+    tool schemas and the structured output schema (tool_choice / response_format).
+    """
+    digest = hashlib.sha256()
+    digest.update(normalize_prompt(prompt).encode("utf-8"))
+    digest.update(b"\x00")
+    digest.update(llm_string.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class LLMResponseCache(BaseCache):
+    """
+    Two tier LLM response cache: a bounded in-memory LRU with TTL in front of an
+    optional on-disk SQLite tier. Plugs into any chat model through `cache=`. Hits
+    are returned as copies with a fresh message id and zero token usage.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl_seconds: Optional[float] = 3600, sqlite_path: Optional[str] = None):
+        if maxsize <= 0:
+            raise ValueError("maxsize must be greater than 0")
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self.sqlite_path = sqlite_path
+        self._entries: "OrderedDict[str, tuple[float, RETURN_VAL_TYPE]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.evictions = 0
+        if sqlite_path:
+            self._conn = sqlite3.connect(sqlite_path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, created_at REAL NOT NULL, value TEXT NOT NULL)"
+            )
+            self._conn.commit()
+
+    def _is_expired(self, created_at: float) -> bool:
+        return self.ttl_seconds is not None and time.time() - created_at > self.ttl_seconds
+
+    def _remember(self, key: str, created_at: float, value: RETURN_VAL_TYPE):
+        self._entries[key] = (created_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _disk_lookup(self, key: str) -> Optional[tuple[float, RETURN_VAL_TYPE]]:
+        row = self._conn.execute("SELECT created_at, value FROM llm_cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        created_at, value = row
+        if self._is_expired(created_at):
+            self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+            self._conn.commit()
+            return None
+        return created_at, [loads(generation, allowed_objects="core") for generation in json.loads(value)]
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        key = make_cache_key(prompt, llm_string)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._is_expired(entry[0]):
+                del self._entries[key]
+                entry = None
+            if entry is None and self._conn is not None:
+                entry = self._disk_lookup(key)
+                if entry is not None:
+                    self.disk_hits += 1
+                    self._remember(key, *entry)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return [_as_cache_hit(generation) for generation in entry[1]]
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        key = make_cache_key(prompt, llm_string)
+        created_at = time.time()
+        # The generations are returned to the caller too, keep a copy it cannot mutate
+        return_val = [generation.model_copy(deep=True) for generation in return_val]
+        with self._lock:
+            self._remember(key, created_at, return_val)
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, created_at, value) VALUES (?, ?, ?)",
+                    (key, created_at, json.dumps([dumps(generation) for generation in return_val])),
+                )
+                self._conn.commit()
+
+    def clear(self, **kwargs: Any) -> None:
+        with self._lock:
+            self._entries.clear()
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM llm_cache")
+                self._conn.commit()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "disk_hits": self.disk_hits,
+            "evictions": self.evictions,
+            "size": len(self._entries),
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+def create_llm_cache() -> Optional[LLMResponseCache]:
+    if os.getenv("LLM_CACHE_ENABLED", "true").lower() != "true":
+        return None
+    ttl = float(os.getenv("LLM_CACHE_TTL_SECONDS", "3600"))
+    return LLMResponseCache(
+        maxsize=int(os.getenv("LLM_CACHE_MAXSIZE", "1024")),
+        ttl_seconds=ttl if ttl > 0 else None,
+        sqlite_path=os.getenv("LLM_CACHE_SQLITE_PATH") or None,
+    )
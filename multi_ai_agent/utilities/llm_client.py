@@ -0,0 +1,362 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import random
+import time
+import weakref
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional
+import httpx
+import openai
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from langchain_openai import ChatOpenAI
+from utilities.instrumentation import metrics
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_ERRORS = (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError, openai.InternalServerError)
+
+metrics.describe("llm_queue_depth", "LLM requests waiting for a concurrency slot or rate limit token")
+metrics.describe("llm_in_flight", "LLM requests currently sent to the provider")
+metrics.describe("llm_queue_wait_seconds", "Time LLM requests waited for a concurrency slot and rate limit token")
+metrics.describe("llm_coalesced_total", "LLM requests answered by an identical in-flight request")
+metrics.describe("llm_failovers_total", "LLM requests moved to the fallback model after a timeout")
+
+
+class TokenBucket:
+    """Requests-per-second limit with bursts of up to `burst` requests."""
+
+    def __init__(self, rate: float, burst: Optional[int] = None):
+        self.rate = rate
+        self.capacity = burst or max(1, int(rate))
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class LLMRequestLimiter:
+    """
+    Global plus per-model concurrency limits and an optional per-model token bucket.
+    Semaphores are created per event loop, so the limiter can be shared module wide.
+    """
+
+    def __init__(self, max_concurrency: int = 32, model_concurrency: int = 16,
+                 requests_per_second: float = 0.0, burst: Optional[int] = None):
+        self.max_concurrency = max_concurrency
+        self.model_concurrency = model_concurrency
+        self.requests_per_second = requests_per_second
+        self.burst = burst
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.waiting: Dict[str, int] = defaultdict(int)
+        self.in_flight: Dict[str, int] = defaultdict(int)
+        self._loop_semaphores = weakref.WeakKeyDictionary()
+
+    def _semaphores(self, model: str):
+        loop = asyncio.get_running_loop()
+        if loop not in self._loop_semaphores:
+            self._loop_semaphores[loop] = (asyncio.Semaphore(self.max_concurrency), {})
+        global_semaphore, model_semaphores = self._loop_semaphores[loop]
+        if model not in model_semaphores:
+            model_semaphores[model] = asyncio.Semaphore(self.model_concurrency)
+        return global_semaphore, model_semaphores[model]
+
+    def _bucket(self, model: str) -> Optional[TokenBucket]:
+        if self.requests_per_second <= 0:
+            return None
+        if model not in self.buckets:
+            self.buckets[model] = TokenBucket(self.requests_per_second, self.burst)
+        return self.buckets[model]
+
+    def _export(self, model: str):
+        metrics.set_gauge("llm_queue_depth", self.waiting[model], {"model": model})
+        metrics.set_gauge("llm_in_flight", self.in_flight[model], {"model": model})
+
+    @asynccontextmanager
+    async def slot(self, model: str):
+        global_semaphore, model_semaphore = self._semaphores(model)
+        started = time.monotonic()
+        self.waiting[model] += 1
+        self._export(model)
+        try:
+            await global_semaphore.acquire()
+            try:
+                await model_semaphore.acquire()
+            except BaseException:
+                global_semaphore.release()
+                raise
+        finally:
+            self.waiting[model] -= 1
+        try:
+            bucket = self._bucket(model)
+            if bucket is not None:
+                await bucket.acquire()
+            metrics.observe("llm_queue_wait_seconds", time.monotonic() - started, {"model": model})
+            self.in_flight[model] += 1
+            self._export(model)
+            try:
+                yield
+            finally:
+                self.in_flight[model] -= 1
+                self._export(model)
+        finally:
+            model_semaphore.release()
+            global_semaphore.release()
+
+    def stats(self) -> Dict[str, dict]:
+        models = set(self.waiting) | set(self.in_flight)
+        return {model: {"waiting": self.waiting[model], "in_flight": self.in_flight[model]} for model in models}
+
+
+class LoopScopedTransport(httpx.AsyncBaseTransport):
+    """
+    One keep-alive connection pool per event loop. Pooled connections are bound to the
+    loop that opened them, so a client shared module wide (used from several loops, e.g.
+    one asyncio.run per batch or benchmark) must not hand them to another loop.
+    """
+
+    def __init__(self, **transport_kwargs):
+        self.transport_kwargs = transport_kwargs
+        self._loop_transports = weakref.WeakKeyDictionary()
+
+    def _transport(self) -> httpx.AsyncHTTPTransport:
+        loop = asyncio.get_running_loop()
+        if loop not in self._loop_transports:
+            self._loop_transports[loop] = httpx.AsyncHTTPTransport(**self.transport_kwargs)
+        return self._loop_transports[loop]
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        return await self._transport().handle_async_request(request)
+
+    async def aclose(self):
+        transport = self._loop_transports.pop(asyncio.get_running_loop(), None)
+        if transport is not None:
+            await transport.aclose()
+
+
+def create_http_async_client() -> httpx.AsyncClient:
+    """Shared keep-alive connection pool for all provider calls, one per event loop."""
+    return httpx.AsyncClient(
+        transport=LoopScopedTransport(limits=httpx.Limits(
+            max_connections=int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "64")),
+            max_keepalive_connections=int(os.getenv("LLM_HTTP_MAX_KEEPALIVE", "32")),
+            keepalive_expiry=30.0,
+        )),
+        timeout=httpx.Timeout(float(os.getenv("LLM_TIMEOUT_SECONDS", "30")), connect=5.0),
+    )
+
+
+llm_limiter = LLMRequestLimiter(
+    max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "32")),
+    model_concurrency=int(os.getenv("LLM_MODEL_CONCURRENCY", "16")),
+    requests_per_second=float(os.getenv("LLM_REQUESTS_PER_SECOND", "0")),
+    burst=int(os.getenv("LLM_BURST", "0")) or None,
+)
+metrics.register_collector("llm_limiter", llm_limiter.stats)
+
+# Identical requests currently waiting for the provider, and streams being received, per event loop
+_in_flight_requests: Dict[tuple, asyncio.Future] = {}
+_in_flight_streams: Dict[tuple, "StreamBroadcast"] = {}
+
+
+class StreamBroadcast:
+    """
+    Chunks of a stream received once by a background task and replayed to every identical
+    stream request that joined it. The task is cancelled when the last of them stops reading.
+    """
+
+    def __init__(self):
+        self.chunks: List[ChatGenerationChunk] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.changed = asyncio.Event()
+        self.consumers = 0
+        self.task: Optional[asyncio.Task] = None
+
+    def _notify(self):
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+    def publish(self, chunk: ChatGenerationChunk):
+        self.chunks.append(chunk)
+        self._notify()
+
+    def finish(self, error: Optional[BaseException] = None):
+        self.done = True
+        self.error = error
+        self._notify()
+
+    async def replay(self) -> AsyncIterator[ChatGenerationChunk]:
+        position = 0
+        while True:
+            if position < len(self.chunks):
+                position += 1
+                # Each consumer's caller sets its own run id on the chunk
+                yield self.chunks[position - 1].model_copy(deep=True)
+            elif self.error is not None:
+                raise self.error
+            elif self.done:
+                return
+            else:
+                await self.changed.wait()
+
+
+def _request_key(payload: dict) -> tuple:
+    digest = hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+    return id(asyncio.get_running_loop()), digest
+
+
+class ResilientChatOpenAI(ChatOpenAI):
+    """
+    ChatOpenAI behind the shared request limiter. Identical in-flight requests are sent
+    once (single-flight); identical streams are received once and replayed to the others,
+    token callbacks included. Retryable errors are retried with jittered exponential backoff
+    (honouring Retry-After), and after a timeout the request fails over to
+    `fallback_model` when one is set. The SDK's own retries are disabled.
+    """
+
+    fallback_model: Optional[str] = None
+    retry_attempts: int = 3
+    backoff_seconds: float = 0.5
+    max_backoff_seconds: float = 8.0
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        retry_after = getattr(getattr(error, "response", None), "headers", {}).get("retry-after")
+        if retry_after:
+            try:
+                return min(float(retry_after), self.max_backoff_seconds)
+            except ValueError:
+                pass
+        # Full jitter keeps retrying clients from synchronizing into new bursts
+        return random.uniform(0, min(self.max_backoff_seconds, self.backoff_seconds * 2 ** attempt))
+
+    def _on_retryable_error(self, error: Exception, attempt: int, kwargs: dict) -> float:
+        model = kwargs.get("model", self.model_name)
+        metrics.inc("llm_retries_total", {"model": model, "error": type(error).__name__})
+        if isinstance(error, openai.APITimeoutError) and self.fallback_model and model != self.fallback_model:
+            logger.warning("%s timed out, failing over to %s", model, self.fallback_model)
+            metrics.inc("llm_failovers_total", {"model": model, "fallback": self.fallback_model})
+            kwargs["model"] = self.fallback_model
+            return 0.0
+        return self._backoff(attempt, error)
+
+    async def _agenerate_with_retries(self, messages: List[BaseMessage], stop, run_manager, kwargs: dict) -> ChatResult:
+        for attempt in range(self.retry_attempts + 1):
+            try:
+                async with llm_limiter.slot(kwargs.get("model", self.model_name)):
+                    return await super()._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+            except RETRYABLE_ERRORS as error:
+                if attempt == self.retry_attempts:
+                    raise
+                delay = self._on_retryable_error(error, attempt, kwargs)
+                logger.info("retrying LLM request in %.2fs after %s", delay, type(error).__name__)
+                await asyncio.sleep(delay)
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager=None, **kwargs: Any) -> ChatResult:
+        payload = self._get_request_payload(messages, stop=stop, **kwargs)
+        key = _request_key(payload)
+        leader = _in_flight_requests.get(key)
+        if leader is not None:
+            metrics.inc("llm_coalesced_total", {"model": payload.get("model", self.model_name)})
+            try:
+                return (await asyncio.shield(leader)).model_copy(deep=True)
+            except asyncio.CancelledError:
+                # Only the leader was cancelled, not this request: send it on its own
+                if not leader.cancelled():
+                    raise
+            return await self._agenerate_with_retries(messages, stop, run_manager, dict(kwargs))
+
+        future = asyncio.get_running_loop().create_future()
+        _in_flight_requests[key] = future
+        try:
+            result = await self._agenerate_with_retries(messages, stop, run_manager, dict(kwargs))
+            future.set_result(result)
+            return result.model_copy(deep=True)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as error:
+            future.set_exception(error)
+            # Followers re-raise it, mark it retrieved so a lone leader does not log it
+            future.exception()
+            raise
+        finally:
+            _in_flight_requests.pop(key, None)
+
+    async def _astream_with_retries(self, messages: List[BaseMessage], stop, run_manager,
+                                    kwargs: dict) -> AsyncIterator[ChatGenerationChunk]:
+        # Only retried while nothing has been yielded yet
+        for attempt in range(self.retry_attempts + 1):
+            started_streaming = False
+            try:
+                async with llm_limiter.slot(kwargs.get("model", self.model_name)):
+                    async for chunk in super()._astream(messages, stop=stop, run_manager=run_manager, **kwargs):
+                        started_streaming = True
+                        yield chunk
+                return
+            except RETRYABLE_ERRORS as error:
+                if started_streaming or attempt == self.retry_attempts:
+                    raise
+                await asyncio.sleep(self._on_retryable_error(error, attempt, kwargs))
+
+    async def _receive_stream(self, broadcast: StreamBroadcast, key: tuple, messages: List[BaseMessage],
+                              stop, kwargs: dict):
+        try:
+            # Token callbacks are fired by each consumer for its own run
+            async for chunk in self._astream_with_retries(messages, stop, None, kwargs):
+                broadcast.publish(chunk)
+            broadcast.finish()
+        except Exception as error:
+            broadcast.finish(error)
+        finally:
+            if _in_flight_streams.get(key) is broadcast:
+                del _in_flight_streams[key]
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager=None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        payload = self._get_request_payload(messages, stop=stop, **{**kwargs, "stream": True})
+        key = _request_key(payload)
+        broadcast = _in_flight_streams.get(key)
+        if broadcast is None:
+            broadcast = _in_flight_streams[key] = StreamBroadcast()
+            broadcast.task = asyncio.create_task(self._receive_stream(broadcast, key, messages, stop, dict(kwargs)))
+        else:
+            metrics.inc("llm_coalesced_total", {"model": payload.get("model", self.model_name)})
+        broadcast.consumers += 1
+        try:
+            async for chunk in broadcast.replay():
+                if run_manager:
+                    await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+                yield chunk
+        finally:
+            broadcast.consumers -= 1
+            if broadcast.consumers == 0 and not broadcast.done:
+                # Nobody reads the stream any more
+                broadcast.task.cancel()
+                if _in_flight_streams.get(key) is broadcast:
+                    del _in_flight_streams[key]
+
+
+def create_chat_model(cache=None) -> ResilientChatOpenAI:
+    return ResilientChatOpenAI(
+        model=os.getenv("LLM_MODEL", "gpt-4o-mini"),
+        fallback_model=os.getenv("LLM_FALLBACK_MODEL") or None,
+        retry_attempts=int(os.getenv("LLM_RETRY_ATTEMPTS", "3")),
+        request_timeout=float(os.getenv("LLM_TIMEOUT_SECONDS", "30")),
+        max_retries=0,
+        http_async_client=create_http_async_client(),
+        cache=cache,
+    )
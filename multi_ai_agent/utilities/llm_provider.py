@@ -1,7 +1,35 @@
-from langchain_openai import ChatOpenAI
+from typing import Optional
+from langchain_core.language_models.chat_models import BaseChatModel
 from dotenv import load_dotenv
+from utilities.llm_cache import create_llm_cache
 
 
 load_dotenv()
 
-llm = ChatOpenAI(model="gpt-4o-mini")
\ No newline at end of file
+llm_cache = create_llm_cache()
+
+_llm: Optional[BaseChatModel] = None
+
+
+def get_llm() -> BaseChatModel:
+    """Shared chat model, constructed on first use so importing the agents stays cheap."""
+    global _llm
+    if _llm is None:
+        from utilities.llm_client import create_chat_model
+
+        # cache=None falls back to the global langchain cache, so an explicit False disables it
+        _llm = create_chat_model(cache=llm_cache if llm_cache is not None else False)
+    return _llm
+
+
+def set_llm(model: BaseChatModel):
+    """Replaces the shared chat model, e.g. with a fake model for benchmarks. Call before the first dispatch."""
+    global _llm
+    _llm = model
+
+
+def __getattr__(name):
+    # Keeps `from utilities.llm_provider import llm` working, constructing the model lazily
+    if name == "llm":
+        return get_llm()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
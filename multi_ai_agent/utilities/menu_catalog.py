@@ -0,0 +1,431 @@
+"""
+Compiled, memory-mapped menu catalog.
+
+Every `<restaurant_id>_menu.json` in the source directory is compiled into a columnar
+`<restaurant_id>.menu` file: float64 prices, health tag bitsets, UTF-8 strings with
+offset columns and a row index sorted by item id. Compiled files are mapped read-only,
+so worker processes share the same pages and opening a menu costs a header read no
+matter how large the catalog grows. A manifest records the source each file was built
+from, and only menus whose source changed are recompiled. Compilation is serialized
+with a file lock, so processes sharing the catalog directory never lose manifest updates.
+
+    cd multi_ai_agent
+    python -m utilities.menu_catalog          # compile changed menus and print the catalog
+"""
+import asyncio
+import json
+import logging
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+import numpy as np
+from dotenv import load_dotenv
+from utilities.menu_index import derive_health_tags, tokenize
+
+try:
+    import fcntl
+except ImportError:  # Windows: only threads of one process are serialized
+    fcntl = None
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_SOURCE_DIR = os.path.join(PACKAGE_DIR, "mock")
+DEFAULT_CATALOG_DIR = os.path.join(PACKAGE_DIR, "menu_catalog")
+DEFAULT_RESTAURANT_ID = "south_indian_veg"
+
+FORMAT_VERSION = 2
+MAGIC = b"MENUCAT1"
+# magic, metadata offset, metadata length; the columns follow, each 8-byte aligned
+HEADER = struct.Struct("<8sQQ")
+SOURCE_SUFFIX = "_menu.json"
+RESTAURANT_ID_PATTERN = re.compile(r"[a-z0-9_\-]+")
+NO_ROWS = np.zeros(0, dtype=np.int64)
+
+
+def _align(offset: int) -> int:
+    return (offset + 7) & ~7
+
+
+def compile_menu(menu_data: dict, restaurant_id: str, path: str) -> dict:
+    """Writes the columnar file of one menu atomically and returns its metadata."""
+    items = [{**item, "tags": derive_health_tags(item)} for item in menu_data.get("items", [])]
+    tags = sorted({tag for item in items for tag in item["tags"]})
+    tag_bits = {tag: position for position, tag in enumerate(tags)}
+    words = max(1, (len(tags) + 63) // 64)
+    tag_column = np.zeros((len(items), words), dtype=np.uint64)
+    for row, item in enumerate(items):
+        for tag in item["tags"]:
+            tag_column[row, tag_bits[tag] // 64] |= np.uint64(1 << (tag_bits[tag] % 64))
+
+    # Ids, then names, then descriptions in one UTF-8 blob; row r of field f spans
+    # string_offsets[f * n + r] to string_offsets[f * n + r + 1]
+    strings = [item[field].encode("utf-8") for field in ("id", "name", "description")
+               for item in ({"description": "", **item} for item in items)]
+    string_offsets = np.zeros(len(strings) + 1, dtype=np.uint32)
+    np.cumsum([len(string) for string in strings], out=string_offsets[1:])
+    prices = np.array([item["price"] for item in items], dtype=np.float64)
+    # Rows sorted by id, with the ids as a fixed-width column so lookups are a numpy binary search
+    id_order = np.array(sorted(range(len(items)), key=lambda row: items[row]["id"]), dtype=np.uint32)
+    id_width = max([1] + [len(string) for string in strings[:len(items)]])
+    sorted_ids = np.array([strings[row] for row in id_order], dtype=f"S{id_width}")
+    columns = {
+        "price": prices.tobytes(),
+        "tags": tag_column.tobytes(),
+        "id_order": id_order.tobytes(),
+        "sorted_ids": sorted_ids.tobytes(),
+        "string_offsets": string_offsets.tobytes(),
+        "strings": b"".join(strings),
+    }
+
+    meta = {
+        "format": FORMAT_VERSION,
+        "restaurant_id": restaurant_id,
+        "restaurant": menu_data.get("restaurant"),
+        "item_count": len(items),
+        "tags": tags,
+        "tag_words": words,
+        "id_width": id_width,
+        "price_range": {"min": float(prices.min()), "max": float(prices.max())} if len(items) else {"min": None, "max": None},
+        "columns": {},
+    }
+    body = bytearray(HEADER.size)
+    for name, data in columns.items():
+        body.extend(b"\0" * (_align(len(body)) - len(body)))
+        meta["columns"][name] = [len(body), len(data)]
+        body.extend(data)
+    meta_bytes = json.dumps(meta).encode("utf-8")
+    HEADER.pack_into(body, 0, MAGIC, len(body), len(meta_bytes))
+    body.extend(meta_bytes)
+
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    with open(temporary_path, "wb") as file:
+        file.write(body)
+    os.replace(temporary_path, path)
+    return meta
+
+
+class CompiledMenu:
+    """
+    Read-only view of a compiled menu. Columns are numpy arrays over the mapped file and
+    item dicts are only materialized for the rows a lookup returns. Structures derived
+    from the menu (search tokens, diet matrices) are kept on it with `cached()`, so they
+    are dropped together with it. The file stays mapped as long as the object is referenced.
+    """
+
+    def __init__(self, path: str, fingerprint: str):
+        self.path = path
+        self.fingerprint = fingerprint
+        self._derived: Dict[str, Any] = {}
+        with open(path, "rb") as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, meta_offset, meta_length = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a compiled menu")
+        self.meta = json.loads(self._mmap[meta_offset:meta_offset + meta_length])
+        self.restaurant_id = self.meta["restaurant_id"]
+        self.restaurant = self.meta["restaurant"]
+        self.tags = self.meta["tags"]
+        self.tag_bits = {tag: position for position, tag in enumerate(self.tags)}
+        self.prices = self._column("price", np.float64)
+        self.tag_column = self._column("tags", np.uint64).reshape(len(self), self.meta["tag_words"])
+        self.id_order = self._column("id_order", np.uint32)
+        self.sorted_ids = self._column("sorted_ids", np.dtype(f"S{self.meta['id_width']}"))
+        string_offsets = self._column("string_offsets", np.uint32)
+        count = len(self)
+        self.id_offsets = string_offsets[:count + 1]
+        self.name_offsets = string_offsets[count:2 * count + 1]
+        self.description_offsets = string_offsets[2 * count:]
+        offset, length = self.meta["columns"]["strings"]
+        self.strings = memoryview(self._mmap)[offset:offset + length]
+
+    def _column(self, name: str, dtype) -> np.ndarray:
+        offset, length = self.meta["columns"][name]
+        dtype = np.dtype(dtype)
+        return np.frombuffer(self._mmap, dtype=dtype, count=length // dtype.itemsize, offset=offset)
+
+    def _string(self, offsets: np.ndarray, row: int) -> str:
+        return str(self.strings[offsets[row]:offsets[row + 1]], "utf-8")
+
+    def __len__(self):
+        return self.meta["item_count"]
+
+    def item_id(self, row: int) -> str:
+        return self._string(self.id_offsets, row)
+
+    def row_of(self, item_id: str) -> Optional[int]:
+        """Row of the item, by binary search over the id-sorted index."""
+        key = item_id.encode("utf-8") if isinstance(item_id, str) else b""
+        position = int(np.searchsorted(self.sorted_ids, key))
+        if key and position < len(self) and self.sorted_ids[position] == key:
+            return int(self.id_order[position])
+        return None
+
+    def row_tags(self, row: int) -> List[str]:
+        words = self.tag_column[row]
+        return [tag for tag, bit in self.tag_bits.items() if int(words[bit // 64]) >> (bit % 64) & 1]
+
+    def column_strings(self, field: str) -> List[str]:
+        """Decoded "id", "name" or "description" of every row, without building item dicts."""
+        offsets = {"id": self.id_offsets, "name": self.name_offsets, "description": self.description_offsets}[field]
+        return [self._string(offsets, row) for row in range(len(self))]
+
+    def brief(self, row: int) -> dict:
+        return {"id": self.item_id(row), "name": self._string(self.name_offsets, row), "price": float(self.prices[row])}
+
+    def item(self, row: int) -> dict:
+        return {
+            "id": self.item_id(row),
+            "name": self._string(self.name_offsets, row),
+            "description": self._string(self.description_offsets, row),
+            "price": float(self.prices[row]),
+            "tags": self.row_tags(row),
+        }
+
+    def get(self, item_id: str) -> Optional[dict]:
+        row = self.row_of(item_id)
+        return None if row is None else self.item(row)
+
+    def get_many(self, item_ids) -> List[dict]:
+        return [item for item in map(self.get, item_ids) if item is not None]
+
+    def items(self) -> Iterator[dict]:
+        return (self.item(row) for row in range(len(self)))
+
+    def overview(self) -> List[dict]:
+        """Id, name and price of every item, in menu order, without decoding descriptions."""
+        return [self.brief(row) for row in range(len(self))]
+
+    def cached(self, name: str, build: Callable[["CompiledMenu"], Any]) -> Any:
+        """Structure derived from this menu, built on first use and kept while the menu stays mapped."""
+        value = self._derived.get(name)
+        if value is None:
+            value = self._derived[name] = build(self)
+        return value
+
+    def filter_rows(self, tags: Optional[List[str]] = None, max_price: Optional[float] = None) -> np.ndarray:
+        """Rows having all `tags` and priced at most `max_price`, from the tag bitsets and price column."""
+        mask = np.ones(len(self), dtype=bool)
+        for tag in tags or []:
+            bit = self.tag_bits.get(tag.lower())
+            if bit is None:
+                return NO_ROWS
+            mask &= (self.tag_column[:, bit // 64] & np.uint64(1 << (bit % 64))) != 0
+        if max_price is not None:
+            mask &= self.prices <= max_price
+        return np.flatnonzero(mask)
+
+    @staticmethod
+    def _build_token_rows(menu: "CompiledMenu") -> Dict[str, np.ndarray]:
+        token_rows: Dict[str, list] = {}
+        for row, (name, description) in enumerate(zip(menu.column_strings("name"), menu.column_strings("description"))):
+            for token in set(tokenize(f"{name} {description}")):
+                token_rows.setdefault(token, []).append(row)
+        return {token: np.array(rows, dtype=np.int64) for token, rows in token_rows.items()}
+
+    def search(self, query: str = "", tags: Optional[List[str]] = None,
+               max_price: Optional[float] = None, limit: int = 10) -> List[dict]:
+        """
+        Items matching all `tags` and priced at most `max_price`, ranked by the number of
+        query tokens in their name and description, then by price and id. An empty query
+        matches every item. Only the returned rows are materialized.
+        """
+        rows = self.filter_rows(tags, max_price)
+        scores = np.zeros(len(self), dtype=np.int32)
+        query_tokens = tokenize(query or "")
+        if query_tokens:
+            token_rows = self.cached("token_rows", self._build_token_rows)
+            for token in query_tokens:
+                scores[token_rows.get(token, NO_ROWS)] += 1
+            rows = rows[scores[rows] > 0]
+        id_rank = self.cached("id_rank", lambda menu: np.argsort(menu.id_order))
+        ranked = rows[np.lexsort((id_rank[rows], self.prices[rows], -scores[rows]))]
+        return [self.item(int(row)) for row in ranked[:limit]]
+
+    def summary(self) -> dict:
+        return {
+            "restaurant_id": self.restaurant_id,
+            "restaurant": self.restaurant,
+            "item_count": len(self),
+            "price_range": self.meta["price_range"],
+            "tags": self.tags,
+        }
+
+
+class MenuCatalog:
+    """
+    Per-restaurant access to the compiled menus. A menu is recompiled when its source
+    file changes and remapped on the next lookup; `refresh()` syncs the whole catalog.
+    At most `max_mapped_menus` menus are kept, the least recently used is dropped and
+    unmapped once the callers still holding it are done.
+    Async callers use `aget()`/`arestaurants()`, which compile in a worker thread.
+    """
+
+    def __init__(self, source_dir: str = DEFAULT_SOURCE_DIR, catalog_dir: str = DEFAULT_CATALOG_DIR,
+                 default_restaurant_id: str = DEFAULT_RESTAURANT_ID, max_mapped_menus: int = 32):
+        self.source_dir = source_dir
+        self.catalog_dir = catalog_dir
+        self.default_restaurant_id = default_restaurant_id
+        self.max_mapped_menus = max_mapped_menus
+        self.manifest_path = os.path.join(catalog_dir, "manifest.json")
+        self.lock_path = os.path.join(catalog_dir, ".lock")
+        self.menus: "OrderedDict[str, CompiledMenu]" = OrderedDict()
+        # `lock` guards the mapped menus, `build_lock` the manifest and compiled files
+        self.lock = threading.Lock()
+        self.build_lock = threading.Lock()
+
+    def source_path(self, restaurant_id: str) -> str:
+        return os.path.join(self.source_dir, f"{restaurant_id}{SOURCE_SUFFIX}")
+
+    def compiled_path(self, restaurant_id: str) -> str:
+        return os.path.join(self.catalog_dir, f"{restaurant_id}.menu")
+
+    def source_ids(self) -> List[str]:
+        return sorted(name[:-len(SOURCE_SUFFIX)] for name in os.listdir(self.source_dir)
+                      if name.endswith(SOURCE_SUFFIX) and RESTAURANT_ID_PATTERN.fullmatch(name[:-len(SOURCE_SUFFIX)]))
+
+    def load_manifest(self) -> dict:
+        try:
+            with open(self.manifest_path) as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    @contextmanager
+    def _building(self):
+        """Serializes load, compile and save of the manifest across threads and processes."""
+        with self.build_lock:
+            os.makedirs(self.catalog_dir, exist_ok=True)
+            with open(self.lock_path, "a") as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                yield
+
+    def _mapped(self, restaurant_id: str, fingerprint: str) -> Optional[CompiledMenu]:
+        with self.lock:
+            menu = self.menus.get(restaurant_id)
+            if menu is None or menu.fingerprint != fingerprint:
+                return None
+            self.menus.move_to_end(restaurant_id)
+            return menu
+
+    def _map(self, restaurant_id: str, menu: CompiledMenu):
+        # Replaced and evicted menus are only dropped, never unmapped here: callers may
+        # still hold them, and the mapping is released with their last reference.
+        with self.lock:
+            self.menus.pop(restaurant_id, None)
+            self.menus[restaurant_id] = menu
+            while len(self.menus) > self.max_mapped_menus:
+                self.menus.popitem(last=False)
+
+    def save_manifest(self, manifest: dict):
+        temporary_path = f"{self.manifest_path}.{os.getpid()}.tmp"
+        with open(temporary_path, "w") as file:
+            json.dump(manifest, file, indent=1, sort_keys=True)
+        os.replace(temporary_path, self.manifest_path)
+
+    @staticmethod
+    def fingerprint(stat: os.stat_result) -> str:
+        return f"{FORMAT_VERSION}:{stat.st_mtime_ns}:{stat.st_size}"
+
+    def _compile(self, restaurant_id: str, manifest: dict, fingerprint: str):
+        started = time.perf_counter()
+        with open(self.source_path(restaurant_id)) as file:
+            menu_data = json.load(file)
+        meta = compile_menu(menu_data, restaurant_id, self.compiled_path(restaurant_id))
+        manifest[restaurant_id] = {
+            "fingerprint": fingerprint,
+            "restaurant": meta["restaurant"],
+            "item_count": meta["item_count"],
+            "compiled_at": time.time(),
+        }
+        logger.info("compiled menu %s (%d items) in %.3fs", restaurant_id, meta["item_count"], time.perf_counter() - started)
+
+    def _is_current(self, restaurant_id: str, manifest: dict, fingerprint: str) -> bool:
+        entry = manifest.get(restaurant_id)
+        return bool(entry) and entry["fingerprint"] == fingerprint and os.path.exists(self.compiled_path(restaurant_id))
+
+    def refresh(self) -> dict:
+        """Compiles new and changed menus and drops the ones whose source is gone."""
+        with self._building():
+            manifest = self.load_manifest()
+            source_ids = self.source_ids()
+            compiled = []
+            for restaurant_id in source_ids:
+                fingerprint = self.fingerprint(os.stat(self.source_path(restaurant_id)))
+                if not self._is_current(restaurant_id, manifest, fingerprint):
+                    self._compile(restaurant_id, manifest, fingerprint)
+                    compiled.append(restaurant_id)
+            removed = sorted(set(manifest) - set(source_ids))
+            for restaurant_id in removed:
+                manifest.pop(restaurant_id)
+                with self.lock:
+                    self.menus.pop(restaurant_id, None)
+                if os.path.exists(self.compiled_path(restaurant_id)):
+                    os.remove(self.compiled_path(restaurant_id))
+            if compiled or removed:
+                self.save_manifest(manifest)
+        return {"compiled": compiled, "removed": removed, "unchanged": len(source_ids) - len(compiled)}
+
+    def get(self, restaurant_id: Optional[str] = None) -> CompiledMenu:
+        """Mapped menu of the restaurant (the default one when not given), compiled first if its source changed."""
+        restaurant_id = restaurant_id or self.default_restaurant_id
+        if not RESTAURANT_ID_PATTERN.fullmatch(restaurant_id):
+            raise KeyError(f"Unknown restaurant {restaurant_id}")
+        try:
+            fingerprint = self.fingerprint(os.stat(self.source_path(restaurant_id)))
+        except FileNotFoundError:
+            raise KeyError(f"Unknown restaurant {restaurant_id}") from None
+        menu = self._mapped(restaurant_id, fingerprint)
+        if menu is not None:
+            return menu
+        with self._building():
+            # Another thread may have mapped it while this one waited
+            menu = self._mapped(restaurant_id, fingerprint)
+            if menu is not None:
+                return menu
+            manifest = self.load_manifest()
+            if not self._is_current(restaurant_id, manifest, fingerprint):
+                self._compile(restaurant_id, manifest, fingerprint)
+                self.save_manifest(manifest)
+            menu = CompiledMenu(self.compiled_path(restaurant_id), fingerprint)
+            self._map(restaurant_id, menu)
+        return menu
+
+    async def aget(self, restaurant_id: Optional[str] = None) -> CompiledMenu:
+        return await asyncio.to_thread(self.get, restaurant_id)
+
+    def restaurants(self) -> List[dict]:
+        """Restaurants of the catalog from the manifest, without mapping their menus."""
+        self.refresh()
+        return [{"restaurant_id": restaurant_id, "restaurant": entry["restaurant"], "item_count": entry["item_count"]}
+                for restaurant_id, entry in sorted(self.load_manifest().items())]
+
+    async def arestaurants(self) -> List[dict]:
+        return await asyncio.to_thread(self.restaurants)
+
+    def stats(self) -> dict:
+        with self.lock:
+            menus = list(self.menus.values())
+        return {"mapped_menus": len(menus), "mapped_bytes": sum(len(menu._mmap) for menu in menus)}
+
+
+menu_catalog = MenuCatalog(
+    source_dir=os.getenv("MENU_SOURCE_DIR", DEFAULT_SOURCE_DIR),
+    catalog_dir=os.getenv("MENU_CATALOG_DIR", DEFAULT_CATALOG_DIR),
+    default_restaurant_id=os.getenv("DEFAULT_RESTAURANT_ID", DEFAULT_RESTAURANT_ID),
+    max_mapped_menus=int(os.getenv("MENU_INDEX_CACHE_SIZE", "32")),
+)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    print(json.dumps({"refresh": menu_catalog.refresh(), "restaurants": menu_catalog.restaurants()}, indent=2))
@@ -0,0 +1,46 @@
+import re
+from typing import List
+
+# Health tags derived from item names/descriptions, keyed by tag with the keywords that imply it.
+HEALTH_TAG_KEYWORDS = {
+    "diabetes": ["diabetes", "diabetic"],
+    "weight-loss": ["weight loss"],
+    "digestion": ["digestion", "gut"],
+    "high-fiber": ["fiber", "high-fiber"],
+    "protein": ["protein"],
+    "heart-health": ["heart"],
+    "anemia": ["anemia", "iron"],
+    "immunity": ["immunity"],
+    "millet": ["millet", "ragi", "bajra", "kambu"],
+    "dessert": ["dessert", "halwa", "payasam"],
+}
+
+# Keywords only count as whole words (an optional plural "s"), so "Hearty" is not "heart".
+HEALTH_TAG_PATTERNS = {
+    tag: re.compile(r"\b(?:" + "|".join(re.escape(keyword) for keyword in keywords) + r")s?\b")
+    for tag, keywords in HEALTH_TAG_KEYWORDS.items()
+}
+# A clause with any of these words says nothing positive about its keywords,
+# e.g. "not recommended for diabetics" or "avoid with heart conditions".
+NEGATION_PATTERN = re.compile(r"\b(?:not|no|never|without|avoid|unsuitable|isn't|aren't|shouldn't)\b")
+CLAUSE_SEPARATOR_PATTERN = re.compile(r"[.,;:!?()]|\bbut\b")
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def derive_health_tags(item: dict) -> List[str]:
+    """
+    Curated `tags` of the source item plus the tags whose keywords appear as whole
+    words in a clause of the name or description that is not negated.
+    """
+    text = f"{item.get('name', '')}. {item.get('description', '')}".lower()
+    tags = set(tag.lower() for tag in item.get("tags", []))
+    for clause in CLAUSE_SEPARATOR_PATTERN.split(text):
+        if NEGATION_PATTERN.search(clause):
+            continue
+        tags.update(tag for tag, pattern in HEALTH_TAG_PATTERNS.items() if pattern.search(clause))
+    return sorted(tags)
@@ -0,0 +1,146 @@
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from typing import Iterator, List, Optional
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "orders.sqlite")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS orders (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    thread_id TEXT,
+    created_at TEXT NOT NULL,
+    total_amount REAL NOT NULL,
+    items TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS orders_user ON orders (user_id, seq);
+CREATE INDEX IF NOT EXISTS orders_thread ON orders (thread_id, seq);
+CREATE INDEX IF NOT EXISTS orders_created_at ON orders (created_at);
+CREATE TRIGGER IF NOT EXISTS orders_no_update BEFORE UPDATE ON orders
+BEGIN SELECT RAISE(ABORT, 'orders are append-only'); END;
+CREATE TRIGGER IF NOT EXISTS orders_no_delete BEFORE DELETE ON orders
+BEGIN SELECT RAISE(ABORT, 'orders are append-only'); END;
+"""
+
+
+def format_order_id(seq: int) -> str:
+    return f"ORD{seq:04d}"
+
+
+class OrderStore:
+    """
+    Append-only order table in SQLite (WAL). Order ids come from the AUTOINCREMENT
+    key inside the inserting transaction, so they are unique across concurrent
+    requests and processes; history reads page over the (user_id, seq) index.
+    Each thread uses its own connection, so a writer waiting for the SQLite write
+    lock never holds up readers, which WAL lets run alongside it.
+    """
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH):
+        self.db_path = db_path
+        self.local = threading.local()
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        if getattr(self.local, "conn", None) is None:
+            self.local.conn = sqlite3.connect(self.db_path, isolation_level=None, timeout=30)
+            self.local.conn.execute("PRAGMA synchronous=NORMAL")
+        return self.local.conn
+
+    @staticmethod
+    def _row_to_order(row) -> dict:
+        seq, user_id, thread_id, created_at, total_amount, items = row
+        return {
+            "order_id": format_order_id(seq),
+            "user_id": user_id,
+            "thread_id": thread_id,
+            "items": json.loads(items),
+            "total_amount": total_amount,
+            "timestamp": created_at,
+        }
+
+    @staticmethod
+    def _values(order: dict) -> tuple:
+        return (
+            order["user_id"],
+            order.get("thread_id"),
+            order.get("timestamp") or datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            order["total_amount"],
+            json.dumps(order["items"]),
+        )
+
+    def place(self, user_id: str, items: List[dict], total_amount: float, thread_id: Optional[str] = None) -> dict:
+        values = self._values({"user_id": user_id, "thread_id": thread_id, "items": items, "total_amount": total_amount})
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            seq = conn.execute(
+                "INSERT INTO orders (user_id, thread_id, created_at, total_amount, items) VALUES (?, ?, ?, ?, ?)", values
+            ).lastrowid
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return self._row_to_order((seq, *values))
+
+    def bulk_insert(self, orders: List[dict]) -> List[str]:
+        """
+        Inserts many orders (dicts with user_id, items, total_amount and optional
+        thread_id/timestamp) in a single transaction and returns their order ids.
+        """
+        order_ids = []
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for order in orders:
+                seq = conn.execute(
+                    "INSERT INTO orders (user_id, thread_id, created_at, total_amount, items) VALUES (?, ?, ?, ?, ?)",
+                    self._values(order),
+                ).lastrowid
+                order_ids.append(format_order_id(seq))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return order_ids
+
+    def history(self, user_id: str, limit: int = 10, cursor: Optional[str] = None) -> dict:
+        """
+        Newest first page of the user's orders. Pass the returned `next_cursor` to
+        fetch the following page; it is None on the last page.
+        """
+        limit = max(1, min(int(limit), 100))
+        query = "SELECT seq, user_id, thread_id, created_at, total_amount, items FROM orders WHERE user_id = ?"
+        params = [user_id]
+        if cursor:
+            query += " AND seq < ?"
+            params.append(int(cursor))
+        query += " ORDER BY seq DESC LIMIT ?"
+        params.append(limit + 1)
+        rows = self._connection().execute(query, params).fetchall()
+        next_cursor = str(rows[limit - 1][0]) if len(rows) > limit else None
+        return {"orders": [self._row_to_order(row) for row in rows[:limit]], "next_cursor": next_cursor}
+
+    def iter_orders(self, since: Optional[str] = None, batch_size: int = 1000) -> Iterator[dict]:
+        """All orders, oldest first, optionally only those created at or after `since` (ISO timestamp), read in pages."""
+        query = "SELECT seq, user_id, thread_id, created_at, total_amount, items FROM orders WHERE seq > ?"
+        params = []
+        if since:
+            query += " AND created_at >= ?"
+            params.append(since)
+        query += " ORDER BY seq LIMIT ?"
+        last_seq = 0
+        while True:
+            rows = self._connection().execute(query, [last_seq, *params, batch_size]).fetchall()
+            yield from (self._row_to_order(row) for row in rows)
+            if len(rows) < batch_size:
+                return
+            last_seq = rows[-1][0]
+
+
+order_store = OrderStore(os.getenv("ORDER_DB_PATH", DEFAULT_DB_PATH))
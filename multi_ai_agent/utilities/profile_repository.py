@@ -0,0 +1,156 @@
+import asyncio
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+MOCK_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "mock")
+DEFAULT_PROFILE_PATH = os.path.join(MOCK_DIR, "user_health_profile.json")
+
+USER_ID_PATTERN = re.compile(r"[\w.@-]+")
+
+
+def compute_restrictions(profile: dict) -> dict:
+    current_restrictions = []
+    past_restrictions = []
+    for condition in profile["user_health_profile"]["current_conditions"]:
+        current_restrictions.extend(condition["restrictions"])
+    for condition in profile["user_health_profile"]["past_conditions"]:
+        past_restrictions.extend(condition["restrictions"])
+    return {
+        "current_conditions": [condition["name"] for condition in profile["user_health_profile"]["current_conditions"]],
+        "current_restrictions": sorted(set(current_restrictions)),
+        "past_restrictions": sorted(set(past_restrictions)),
+        "all_restrictions": sorted(set(current_restrictions + past_restrictions)),
+    }
+
+
+class ProfileEntry:
+    def __init__(self, version, profile: dict):
+        self.version = version
+        self.profile = profile
+        self.restrictions = compute_restrictions(profile)
+        self.checked_at = time.monotonic()
+
+
+class HealthProfileRepository:
+    """
+    Health profiles keyed by user id, loaded on demand from `<profile_dir>/<user_id>.json`
+    files or from a SQLite `health_profiles(user_id, version, profile)` table, and kept in
+    a bounded LRU. Cached entries are revalidated against the file mtime or the row version
+    at most every `check_interval_seconds`, so edits are picked up without a restart.
+    Users without a profile raise KeyError, unless a default profile is configured for
+    demos. The lock only guards the LRU; profiles are read outside of it, and each
+    thread uses its own SQLite connection. Async callers use `aget()`/`aget_restrictions()`,
+    which stat and read in a worker thread.
+    """
+
+    def __init__(self, profile_dir: Optional[str] = None, sqlite_path: Optional[str] = None,
+                 default_profile_path: Optional[str] = None, maxsize: int = 1024,
+                 check_interval_seconds: float = 1.0):
+        self.profile_dir = profile_dir
+        self.sqlite_path = sqlite_path
+        self.default_profile_path = default_profile_path
+        self.maxsize = maxsize
+        self.check_interval_seconds = check_interval_seconds
+        self.entries: "OrderedDict[str, ProfileEntry]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        if sqlite_path:
+            self._connection().execute(
+                "CREATE TABLE IF NOT EXISTS health_profiles "
+                "(user_id TEXT PRIMARY KEY, version INTEGER NOT NULL DEFAULT 1, profile TEXT NOT NULL)"
+            )
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        if not self.sqlite_path:
+            return None
+        if getattr(self.local, "conn", None) is None:
+            self.local.conn = sqlite3.connect(self.sqlite_path)
+        return self.local.conn
+
+    def _profile_path(self, user_id: str) -> Optional[str]:
+        if self.profile_dir and USER_ID_PATTERN.fullmatch(user_id):
+            path = os.path.join(self.profile_dir, f"{user_id}.json")
+            if os.path.exists(path):
+                return path
+        return self.default_profile_path
+
+    @staticmethod
+    def _file_version(path: str):
+        stat = os.stat(path)
+        return path, stat.st_mtime_ns, stat.st_size
+
+    def _current_version(self, user_id: str):
+        conn = self._connection()
+        if conn is not None:
+            row = conn.execute("SELECT version FROM health_profiles WHERE user_id = ?", (user_id,)).fetchone()
+            if row is not None:
+                return ("db", row[0])
+        path = self._profile_path(user_id)
+        if path is None or not os.path.exists(path):
+            raise KeyError(f"No health profile found for user {user_id}")
+        return self._file_version(path)
+
+    def _load(self, user_id: str, version) -> dict:
+        if version[0] == "db":
+            row = self._connection().execute("SELECT profile FROM health_profiles WHERE user_id = ?", (user_id,)).fetchone()
+            return json.loads(row[0])
+        with open(version[0], "r") as file:
+            return json.load(file)
+
+    def get_entry(self, user_id: str) -> ProfileEntry:
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is not None and time.monotonic() - entry.checked_at < self.check_interval_seconds:
+                self.entries.move_to_end(user_id)
+                return entry
+        # Revalidated and loaded without the lock, so one slow read does not stall other users
+        try:
+            version = self._current_version(user_id)
+        except KeyError:
+            self.invalidate(user_id)
+            raise
+        if entry is None or entry.version != version:
+            entry = ProfileEntry(version, self._load(user_id, version))
+        else:
+            entry.checked_at = time.monotonic()
+        with self.lock:
+            self.entries[user_id] = entry
+            self.entries.move_to_end(user_id)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+            return entry
+
+    def get(self, user_id: str) -> dict:
+        return self.get_entry(user_id).profile
+
+    def get_restrictions(self, user_id: str) -> dict:
+        return self.get_entry(user_id).restrictions
+
+    async def aget(self, user_id: str) -> dict:
+        return (await asyncio.to_thread(self.get_entry, user_id)).profile
+
+    async def aget_restrictions(self, user_id: str) -> dict:
+        return (await asyncio.to_thread(self.get_entry, user_id)).restrictions
+
+    def invalidate(self, user_id: Optional[str] = None):
+        with self.lock:
+            if user_id is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(user_id, None)
+
+
+profile_repository = HealthProfileRepository(
+    profile_dir=os.getenv("HEALTH_PROFILE_DIR") or None,
+    sqlite_path=os.getenv("HEALTH_PROFILE_DB_PATH") or None,
+    # Demo mode: users without a profile get the mock profile instead of none
+    default_profile_path=DEFAULT_PROFILE_PATH if os.getenv("HEALTH_PROFILE_DEMO_MODE", "false").lower() == "true" else None,
+    maxsize=int(os.getenv("HEALTH_PROFILE_CACHE_SIZE", "1024")),
+    check_interval_seconds=float(os.getenv("HEALTH_PROFILE_CHECK_INTERVAL_SECONDS", "1.0")),
+)
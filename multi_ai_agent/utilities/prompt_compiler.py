@@ -0,0 +1,59 @@
+import inspect
+import json
+import re
+from typing import Callable, Dict, NamedTuple
+from utilities.context_manager import count_text_tokens
+
+CATALOG_HEADER = "### Available workers and tools"
+
+
+def describe_tool(tool: Callable) -> dict:
+    """
+    Compact descriptor of a tool function for prompts: its name, the first line of its
+    docstring and its argument names. The full schema is already sent with the bound tools.
+    """
+    doc = inspect.getdoc(tool) or ""
+    summary = doc.splitlines()[0] if doc else ""
+    summary = re.sub(r"^This function\s+", "", summary).rstrip(".")
+    return {"name": tool.__name__, "summary": summary, "args": list(inspect.signature(tool).parameters)}
+
+
+def build_tool_catalog(workers) -> Dict[str, dict]:
+    """Catalog of the workers, anything with `name`, `capabilities` and `tools` attributes."""
+    return {
+        worker.name: {"capabilities": worker.capabilities, "tools": [describe_tool(tool) for tool in worker.tools]}
+        for worker in workers
+    }
+
+
+def render_tool_catalog(catalog: Dict[str, dict]) -> str:
+    # Deterministic and compact so the compiled prompts are byte-identical across restarts
+    return json.dumps(catalog, sort_keys=True, separators=(",", ":"))
+
+
+class CompiledPrompt(NamedTuple):
+    name: str
+    text: str
+    tokens: int
+
+
+class PromptCompiler:
+    """
+    Builds every agent's final system prompt once at startup. The hand written
+    instructions come first and the generated worker/tool catalog last, so all calls of
+    an agent share the same prefix and the conversation is the only part that varies,
+    which keeps provider-side prompt-prefix caching effective.
+    """
+
+    def __init__(self, catalog: Dict[str, dict]):
+        self.catalog = catalog
+        self.catalog_text = render_tool_catalog(catalog)
+        self.prompts: Dict[str, CompiledPrompt] = {}
+
+    def compile(self, name: str, instructions: str, include_catalog: bool = True) -> str:
+        sections = [instructions.strip()]
+        if include_catalog:
+            sections.append(f"{CATALOG_HEADER}\n{self.catalog_text}")
+        text = "\n\n".join(sections)
+        self.prompts[name] = CompiledPrompt(name, text, count_text_tokens(text))
+        return text
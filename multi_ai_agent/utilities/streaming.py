@@ -0,0 +1,80 @@
+import logging
+import os
+import time
+from typing import Dict, List, Optional
+from langgraph.config import get_stream_writer
+
+logger = logging.getLogger(__name__)
+
+STREAMING_ENABLED = os.getenv("STREAM_SUBGRAPHS", "true").lower() == "true"
+
+
+def _percentile(values: List[float], percentile: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(percentile / 100 * (len(ordered) - 1))))]
+
+
+class StreamingMetrics:
+    """
+    Time-to-first-token per worker, measured from the start of the user's turn (as
+    recorded by the supervisor) until the worker's first token is forwarded to the
+    client, so routing and earlier hops count towards it as the user experiences them.
+    """
+
+    def __init__(self, max_samples: int = 1000):
+        self.max_samples = max_samples
+        self.samples: Dict[str, List[float]] = {}
+
+    def record_ttft(self, worker: str, seconds: float):
+        samples = self.samples.setdefault(worker, [])
+        samples.append(seconds)
+        if len(samples) > self.max_samples:
+            del samples[0]
+
+    def stats(self) -> Dict[str, dict]:
+        return {
+            worker: {
+                "count": len(samples),
+                "ttft_p50_seconds": _percentile(samples, 50),
+                "ttft_p95_seconds": _percentile(samples, 95),
+            }
+            for worker, samples in self.samples.items() if samples
+        }
+
+
+streaming_metrics = StreamingMetrics()
+
+
+async def run_subgraph(graph, inputs: dict, worker: str, turn_started_at: Optional[float] = None) -> dict:
+    """
+    Runs a worker sub-graph and returns its final state. In streaming mode the
+    sub-graph is driven with astream_events and its tokens and tool progress are
+    forwarded through the parent graph's custom stream as they arrive, e.g.
+    {"type": "token", "worker": ..., "content": ...}. `turn_started_at` is the
+    time.time() the turn started at, TTFT falls back to the dispatch time without it.
+    """
+    if not STREAMING_ENABLED:
+        return await graph.ainvoke(inputs)
+    writer = get_stream_writer()
+    started = turn_started_at or time.time()
+    first_token = False
+    root_run_id = None
+    output = None
+    async for event in graph.astream_events(inputs, version="v2"):
+        kind = event["event"]
+        if root_run_id is None:
+            root_run_id = event["run_id"]
+        if kind == "on_chat_model_stream":
+            content = event["data"]["chunk"].content
+            if isinstance(content, str) and content:
+                if not first_token:
+                    first_token = True
+                    streaming_metrics.record_ttft(worker, time.time() - started)
+                writer({"type": "token", "worker": worker, "content": content})
+        elif kind == "on_tool_start":
+            writer({"type": "tool_start", "worker": worker, "tool": event["name"]})
+        elif kind == "on_tool_end":
+            writer({"type": "tool_end", "worker": worker, "tool": event["name"]})
+        elif kind == "on_chain_end" and event["run_id"] == root_run_id:
+            output = event["data"]["output"]
+    return output
@@ -1,9 +1,41 @@
+import uuid
+from typing import Optional
+from langgraph.config import get_config
+
 initial_thread_id = 1234
 
 def getConfig():
     return { "configurable": { "thread_id": str(initial_thread_id) } }
 
-def new_thread():
-    global initial_thread_id
-    initial_thread_id += 1
-    return initial_thread_id
\ No newline at end of file
+# Namespace of the deterministic thread ids derived from a key
+THREAD_NAMESPACE = uuid.UUID("6f1c3c2e-8f0b-4b8e-9a55-2f4f3f1d7c10")
+
+def new_thread(key: Optional[str] = None) -> str:
+    """
+    Collision-free thread id, also across processes: random, or derived from `key`
+    so the same conversation always maps to the same thread (e.g. when resuming a batch).
+    """
+    if key is None:
+        return str(uuid.uuid4())
+    return str(uuid.uuid5(THREAD_NAMESPACE, key))
+
+def _current_configurable() -> dict:
+    try:
+        return get_config().get("configurable", {})
+    except RuntimeError:
+        # Called outside of a graph run
+        return {}
+
+def get_current_thread_id():
+    return _current_configurable().get("thread_id")
+
+def get_current_user_id(default: str = "anonymous") -> str:
+    """
+    The user of the running graph. The authenticated user set by the server always
+    wins; the client supplied `user_id` is only used when no auth is configured
+    (offline and batch runs). Falls back to the thread id so single-user threads
+    keep their own data.
+    """
+    configurable = _current_configurable()
+    user_id = configurable.get("langgraph_auth_user_id") or configurable.get("user_id") or configurable.get("thread_id")
+    return str(user_id) if user_id else default
@@ -0,0 +1,97 @@
+import json
+import os
+import time
+from typing import List, Optional
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+
+
+def turn_messages(messages: List[BaseMessage]) -> List[BaseMessage]:
+    """Messages of the current turn, from the latest human message on."""
+    for index in range(len(messages) - 1, -1, -1):
+        if isinstance(messages[index], HumanMessage):
+            return messages[index:]
+    return messages
+
+
+def _tool_succeeded(message: ToolMessage) -> bool:
+    try:
+        return bool(json.loads(message.content).get("status"))
+    except (TypeError, ValueError, AttributeError):
+        return False
+
+
+class TurnScheduler:
+    """
+    Per-turn budgets for the supervisor loop: supervisor hops, tokens spent by the
+    supervisor and the workers, and wall time since the user's message. It also stops
+    a turn that dispatches the same workers again, without new successful tool results
+    in between, more than `max_repeats` times in a row. A budget of 0 disables that check.
+    """
+
+    def __init__(self, max_hops: int = 8, max_tokens: int = 30000, max_seconds: float = 60.0, max_repeats: int = 1):
+        self.max_hops = max_hops
+        self.max_tokens = max_tokens
+        self.max_seconds = max_seconds
+        self.max_repeats = max_repeats
+
+    @staticmethod
+    def turn_tokens(state) -> int:
+        """Tokens of the turn: the supervisor's routing calls plus the workers' LLM calls."""
+        worker_tokens = sum(
+            (message.usage_metadata or {}).get("total_tokens", 0)
+            for message in turn_messages(state["messages"])
+            if isinstance(message, AIMessage)
+        )
+        return state.get("turn_tokens", 0) + worker_tokens
+
+    @staticmethod
+    def progress_marker(state) -> int:
+        return sum(1 for message in turn_messages(state["messages"])
+                   if isinstance(message, ToolMessage) and _tool_succeeded(message))
+
+    def exhausted_budget(self, state, goto: List[str]) -> Optional[str]:
+        """The budget the dispatch of `goto` would exceed, or None when the turn may continue."""
+        if self.max_hops and state.get("hop_count", 0) > self.max_hops:
+            return "hops"
+        if self.max_tokens and self.turn_tokens(state) > self.max_tokens:
+            return "tokens"
+        if self.max_seconds and state.get("turn_started_at") and time.time() - state["turn_started_at"] > self.max_seconds:
+            return "time"
+        if self.max_repeats:
+            route = [",".join(goto), self.progress_marker(state)]
+            history = state.get("route_history") or []
+            repeats = 0
+            for previous in reversed(history):
+                if previous != route:
+                    break
+                repeats += 1
+            if repeats > self.max_repeats:
+                return "repeated_route"
+        return None
+
+    def record_route(self, state, goto: List[str]):
+        state["route_history"] = (state.get("route_history") or []) + [[",".join(goto), self.progress_marker(state)]]
+
+    @staticmethod
+    def final_answer(state, budget: str) -> AIMessage:
+        """Graceful answer built from what the workers produced so far, without another LLM call."""
+        answers = [message.content for message in turn_messages(state["messages"])
+                   if isinstance(message, AIMessage) and not message.tool_calls and isinstance(message.content, str) and message.content]
+        reason = {
+            "hops": "it needed more steps than allowed for a single request",
+            "tokens": "it used up the processing budget for a single request",
+            "time": "it took longer than allowed for a single request",
+            "repeated_route": "the same step kept repeating without new results",
+        }.get(budget, "a limit was reached")
+        if answers:
+            return AIMessage(content=f"{answers[-1]}\n\n(I stopped here because {reason}. Let me know if you want me to continue.)")
+        return AIMessage(content=f"Sorry, I could not complete this request because {reason}. "
+                                 "Could you rephrase it or break it into smaller steps?")
+
+
+turn_scheduler = TurnScheduler(
+    max_hops=int(os.getenv("TURN_MAX_HOPS", "8")),
+    max_tokens=int(os.getenv("TURN_MAX_TOKENS", "30000")),
+    max_seconds=float(os.getenv("TURN_MAX_SECONDS", "60")),
+    max_repeats=int(os.getenv("TURN_MAX_REPEATS", "1")),
+)